@@ -0,0 +1,140 @@
+"""
+Buffered activity logging for the head pose scripts
+ActivityLogger appends (timestamp, label) rows to a CSV file from a background
+thread, writing in batches instead of opening the file for every frame.
+"""
+
+import atexit
+import csv
+import datetime
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class ActivityLogger:
+    """Background CSV logger with a bounded queue.
+
+    ``log`` only enqueues; a writer thread keeps the file open and flushes
+    once ``batch_size`` rows are buffered or ``flush_interval`` seconds have
+    passed, whichever comes first. ``close`` (also run at interpreter exit)
+    writes everything still queued. When the queue is full ``log`` blocks,
+    so rows are never dropped while the writer is healthy. If the writer
+    fails (the file cannot be opened, the disk is full) the error is kept in
+    ``error`` and later rows are counted in ``dropped`` instead of blocking
+    the caller.
+
+    By default every call becomes a ``timestamp,label`` row, the layout of
+    head_pose_log.csv and classroom_activity_log.csv. With ``run_length=True``
+    consecutive calls with the same label are merged into one
+    ``start,end,duration_seconds,label`` row, written when the label changes.
+
+    Passing a ``key`` (e.g. a student id) adds it as a column before the
+    label, and runs are then tracked per key.
+    """
+
+    def __init__(self, path, run_length=False, batch_size=256, flush_interval=1.0, max_queue=10000):
+        self.path = path
+        self.run_length = run_length
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._runs = {}
+        self._closed = False
+        self.error = None
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, label, timestamp=None, key=None):
+        """Queue one observation; the timestamp defaults to now"""
+        if not self._put((timestamp or datetime.datetime.now(), key, label)):
+            self.dropped += 1
+
+    def _put(self, entry):
+        """Queue an entry, waiting while the writer is alive; False once it has died"""
+        while self.error is None and self._thread.is_alive():
+            try:
+                self._queue.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _rows(self, entries):
+        if not self.run_length:
+            return [[timestamp, label] if key is None else [timestamp, key, label]
+                    for timestamp, key, label in entries]
+
+        # Merge consecutive identical labels into (start, end, duration, label) runs
+        rows = []
+        for timestamp, key, label in entries:
+            run = self._runs.get(key)
+            if run is not None and run[2] == label:
+                run[1] = timestamp
+                continue
+            if run is not None:
+                # A run lasts until the next label takes over
+                run[1] = timestamp
+                rows.append(self._run_row(key, run))
+            self._runs[key] = [timestamp, timestamp, label]
+        return rows
+
+    def _run_row(self, key, run):
+        start, end, label = run
+        row = [start, end, round((end - start).total_seconds(), 3), label]
+        if key is not None:
+            row.insert(3, key)
+        return row
+
+    def _write_loop(self):
+        try:
+            self._write_rows()
+        except Exception as e:
+            self.error = e
+            print(f"Activity log {self.path} stopped: {e}")
+
+    def _write_rows(self):
+        with open(self.path, mode='a', newline='') as file:
+            writer = csv.writer(file)
+            pending = []
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while not stopping:
+                try:
+                    entry = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    if entry is _STOP:
+                        stopping = True
+                    else:
+                        pending.append(entry)
+                except queue.Empty:
+                    pass
+
+                if stopping or len(pending) >= self.batch_size or time.monotonic() >= deadline:
+                    rows = self._rows(pending)
+                    if stopping and self.run_length:
+                        rows.extend(self._run_row(key, run) for key, run in self._runs.items())
+                    if rows:
+                        writer.writerows(rows)
+                        file.flush()
+                    pending = []
+                    deadline = time.monotonic() + self.flush_interval
+
+    def close(self):
+        """Flush everything queued and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._put(_STOP):
+            self._thread.join()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,154 @@
+"""
+Production serving mode for the face detection backend
+Same Socket.IO events and HTTP routes as face_detection.py, served by python-socketio's
+AsyncServer on aiohttp. The event loop only parses messages and emits results: decode and
+detection run in the detection engine's worker processes (or, with DETECTION_WORKERS=0,
+on a thread pool), so hundreds of long-lived connections never wait on a CPU-bound frame.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import socketio
+from aiohttp import web
+
+import face_detection as fd
+import metrics
+
+sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*')
+app = web.Application()
+sio.attach(app)
+
+processing_active = False
+
+# Running session loops; the event loop only keeps weak references to tasks
+session_tasks = set()
+
+# Only used when the engine runs inline (DETECTION_WORKERS=0)
+executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+def submit(sid, frame_data, shape):
+    """Detection off the event loop; returns an awaitable result"""
+    if fd.engine.workers > 0:
+        return asyncio.wrap_future(fd.engine.submit(sid, frame_data, shape, key=sid))
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(executor, lambda: fd.engine.submit(sid, frame_data, shape, key=sid).result())
+
+async def run_session(sid, frame):
+    """Process a session's frames until its mailbox is empty, emitting each result"""
+    while frame is not None:
+        submitted = time.perf_counter()
+        try:
+            result = await submit(sid, *frame)
+        except Exception as e:
+            # A dead worker or a timeout still completes the frame, so the session keeps going
+            result = fd.error_result(str(e), type(e).__name__)
+        service_time = time.perf_counter() - submitted
+
+        frame = fd.mailboxes.complete(sid, service_time)
+
+        fd.record_metrics(result)
+        metrics.STAGE_LATENCY.observe(service_time, stage='service')
+        result.update(fd.mailboxes.stats(sid))
+        with metrics.timer(metrics.STAGE_LATENCY, stage='emit'):
+            await sio.emit('detection_result', result, to=sid)
+
+@sio.event
+async def connect(sid, environ):
+    metrics.ACTIVE_SOCKETS.inc()
+    print('Client connected')
+    await sio.emit('status', {'message': 'Connected to face detection service'}, to=sid)
+
+@sio.event
+async def disconnect(sid, *args):
+    fd.mailboxes.remove(sid)
+    fd.engine.discard(sid)
+    metrics.ACTIVE_SOCKETS.dec()
+    print('Client disconnected')
+
+@sio.event
+async def start_detection(sid, *args):
+    global processing_active
+    processing_active = True
+    await sio.emit('status', {'message': 'Face detection started'}, to=sid)
+
+@sio.event
+async def stop_detection(sid, *args):
+    global processing_active
+    processing_active = False
+    await sio.emit('status', {'message': 'Face detection stopped'}, to=sid)
+
+@sio.event
+async def process_frame(sid, data):
+    if not processing_active:
+        return
+
+    frame_data, shape = fd.unpack_frame_message(data)
+    if frame_data is None:
+        return
+
+    # Latest frame wins: start a session loop only if none is running for this client
+    frame = fd.mailboxes.offer(sid, (frame_data, shape))
+    if frame is not None:
+        task = asyncio.create_task(run_session(sid, frame))
+        session_tasks.add(task)
+        task.add_done_callback(session_tasks.discard)
+
+async def health_check(request):
+    stats = fd.engine.stats()
+    return web.json_response({'status': 'degraded' if stats['failed_workers'] else 'healthy', 'mode': 'async',
+                              'detectors': {
+        'dlib': fd.detector is not None,
+        'opencv': fd.face_cascade is not None
+    }, 'engine': stats, 'sessions': fd.mailboxes.totals()})
+
+async def metrics_endpoint(request):
+    return web.Response(body=fd.render_metrics().encode(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+async def detect_faces(request):
+    try:
+        if request.content_type == 'application/json':
+            data = await request.json()
+            if not data or 'frame' not in data:
+                return web.json_response({'error': 'No frame data provided'}, status=400)
+            frame_data, shape = data['frame'], data.get('shape')
+        else:
+            # Binary body: encoded image bytes, or raw pixels with an X-Frame-Shape header
+            frame_data = await request.read()
+            if not frame_data:
+                return web.json_response({'error': 'No frame data provided'}, status=400)
+            shape = request.headers.get('X-Frame-Shape')
+
+        result = await submit(None, frame_data, shape)
+        fd.record_metrics(result)
+        return web.json_response(result)
+
+    except ValueError as e:
+        metrics.ERRORS.inc(type=type(e).__name__)
+        return web.json_response({'error': str(e)}, status=400)
+    except Exception as e:
+        metrics.ERRORS.inc(type=type(e).__name__)
+        return web.json_response({'error': str(e)}, status=500)
+
+async def start_engine(app):
+    """Load the models and start the worker pool however the app is served"""
+    print("Initializing face detection models...")
+    fd.initialize_detectors()
+    fd.engine.start()
+
+async def stop_engine(app):
+    fd.engine.stop()
+    executor.shutdown(wait=False)
+
+app.router.add_get('/health', health_check)
+app.router.add_get('/metrics', metrics_endpoint)
+app.router.add_post('/detect', detect_faces)
+app.on_startup.append(start_engine)
+app.on_cleanup.append(stop_engine)
+
+if __name__ == '__main__':
+    print("Starting async Socket.IO server (aiohttp)...")
+    web.run_app(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,94 @@
+import threading
+
+
+class FrameMailboxes:
+    """Per-session single-slot mailboxes: at most one frame in flight per client, newest frame wins.
+
+    While a session has a frame being processed, newer frames overwrite the
+    waiting slot and the overwritten ones are counted as dropped. The smoothed
+    service time (queue wait + detection) of each session is turned into a
+    recommended send interval for the client.
+    """
+
+    def __init__(self, min_interval_ms=50, max_interval_ms=2000, headroom=1.25, smoothing=0.2):
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self._sessions = {}
+        self._lock = threading.Lock()
+        # Lifetime totals, kept after sessions disconnect
+        self._processed_total = 0
+        self._dropped_total = 0
+
+    def offer(self, sid, frame):
+        """Hand in a new frame; returns it if it should be dispatched now, else parks it"""
+        with self._lock:
+            session = self._sessions.setdefault(sid, {
+                'busy': False,
+                'waiting': None,
+                'dropped': 0,
+                'processed': 0,
+                'service_ms': None
+            })
+            if not session['busy']:
+                session['busy'] = True
+                return frame
+
+            if session['waiting'] is not None:
+                session['dropped'] += 1
+                self._dropped_total += 1
+            session['waiting'] = frame
+            return None
+
+    def complete(self, sid, service_seconds):
+        """Record a finished frame; returns the parked frame to dispatch next, if any"""
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                return None
+
+            session['processed'] += 1
+            self._processed_total += 1
+            service_ms = service_seconds * 1000
+            if session['service_ms'] is None:
+                session['service_ms'] = service_ms
+            else:
+                session['service_ms'] += self.smoothing * (service_ms - session['service_ms'])
+
+            frame, session['waiting'] = session['waiting'], None
+            session['busy'] = frame is not None
+            return frame
+
+    def stats(self, sid):
+        """Dropped-frame count and recommended send interval for one session"""
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None or session['service_ms'] is None:
+                return {'dropped_frames': 0 if session is None else session['dropped'],
+                        'recommended_interval_ms': self.min_interval_ms}
+
+            interval = session['service_ms'] * self.headroom
+            interval = max(self.min_interval_ms, min(self.max_interval_ms, interval))
+            return {
+                'dropped_frames': session['dropped'],
+                'recommended_interval_ms': int(round(interval))
+            }
+
+    def remove(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def totals(self):
+        """Lifetime counters across all sessions for the /health endpoint"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'frames_processed': self._processed_total,
+                'frames_dropped': self._dropped_total
+            }
+
+    def session_counts(self):
+        """(processed, dropped) frame counts of every connected session, keyed by sid"""
+        with self._lock:
+            return {sid: (s['processed'], s['dropped']) for sid, s in self._sessions.items()}
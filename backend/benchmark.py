@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the face detection backend
+Runs offline against recorded frames (a directory of images) or seeded synthetic
+frames, optionally load-tests a running Socket.IO server with simulated clients,
+and writes every result as JSON so runs can be compared across versions.
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import cv2
+import numpy as np
+
+import face_detection as fd
+from detection_engine import DetectionEngine
+
+SUITES = ('stages', 'batching', 'resolution', 'tracking', 'cache', 'engine', 'sockets')
+
+def latency_summary(samples):
+    """Mean and p50/p95/p99 in milliseconds of a list of durations in seconds"""
+    if not samples:
+        return {'count': 0}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'count': len(samples),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3)
+    }
+
+def load_frames(frames_dir=None, count=64, width=640, height=480, seed=0):
+    """Load recorded frames as JPEG bytes, or synthesise them when no directory is given"""
+    payloads = []
+    if frames_dir:
+        paths = sorted(glob.glob(os.path.join(frames_dir, '*.jpg')) + glob.glob(os.path.join(frames_dir, '*.png')))
+        for path in paths[:count]:
+            with open(path, 'rb') as f:
+                payloads.append(f.read())
+        if not payloads:
+            raise SystemExit(f"No .jpg/.png frames found in {frames_dir}")
+        return payloads
+
+    # Smooth gradients plus noise so JPEG sizes and decode cost resemble a webcam frame
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    for _ in range(count):
+        noise = rng.normal(0, 20, (height, width, 3)).astype(np.float32)
+        frame = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        ok, jpg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        payloads.append(jpg.tobytes())
+    return payloads
+
+def bench_stages(payloads, repeat=3):
+    """Time each stage of the per-frame path separately"""
+    data_urls = ['data:image/jpeg;base64,' + base64.b64encode(payload).decode() for payload in payloads]
+    timings = {stage: [] for stage in ('base64_decode', 'imdecode', 'grayscale', 'detect_dlib',
+                                       'detect_haar', 'json_serialise')}
+
+    def timed(stage, fn, *args):
+        start = time.perf_counter()
+        value = fn(*args)
+        timings[stage].append(time.perf_counter() - start)
+        return value
+
+    for _ in range(repeat):
+        for data_url in data_urls:
+            raw = timed('base64_decode', lambda url: base64.b64decode(url.split(',', 1)[1]), data_url)
+            frame = timed('imdecode', cv2.imdecode, np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+            gray = timed('grayscale', cv2.cvtColor, frame, cv2.COLOR_BGR2GRAY)
+            faces = []
+            if fd.detector is not None:
+                faces = timed('detect_dlib', fd.detect_faces_dlib, gray)
+            if fd.face_cascade is not None:
+                faces = timed('detect_haar', fd.detect_faces_opencv, gray)
+            result = {'faces': faces, 'face_count': len(faces), 'timestamp': time.time()}
+            timed('json_serialise', json.dumps, result)
+
+    return {stage: latency_summary(samples) for stage, samples in timings.items() if samples}
+
+def bench_batching(payloads, batch_sizes, repeat=3):
+    """Frames/sec on one core for the per-frame path vs micro-batches of each size"""
+    total = len(payloads) * repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for payload in payloads:
+            fd.process_frame(payload)
+    per_frame_fps = total / (time.perf_counter() - start)
+
+    results = {'per_frame': round(per_frame_fps, 1), 'batched': {}}
+    frames = [(None, payload, None) for payload in payloads]
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for i in range(0, len(frames), batch_size):
+                fd.process_batch(frames[i:i + batch_size])
+        results['batched'][batch_size] = round(total / (time.perf_counter() - start), 1)
+    return results
+
+def iou(a, b):
+    """Intersection over union of two face boxes"""
+    x1, y1 = max(a['x'], b['x']), max(a['y'], b['y'])
+    x2 = min(a['x'] + a['width'], b['x'] + b['width'])
+    y2 = min(a['y'] + a['height'], b['y'] + b['height'])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a['width'] * a['height'] + b['width'] * b['height'] - inter
+    return inter / union if union else 0.0
+
+def bench_resolution(payloads, widths, repeat=3):
+    """Detection speed and recall at each detection width, against full-resolution detections"""
+    grays = [fd.to_gray(fd.decode_frame(payload)) for payload in payloads]
+    configured = fd.DETECTION_WIDTH
+    results = {}
+    try:
+        fd.DETECTION_WIDTH = 0
+        reference = [fd.run_detector(gray) for gray in grays]
+        total_faces = sum(len(faces) for faces in reference)
+
+        for width in widths:
+            fd.DETECTION_WIDTH = width
+            start = time.perf_counter()
+            for _ in range(repeat):
+                detections = [fd.run_detector(gray) for gray in grays]
+            elapsed = time.perf_counter() - start
+
+            found = sum(
+                1 for ref_faces, faces in zip(reference, detections)
+                for ref in ref_faces if any(iou(ref, face) >= 0.5 for face in faces)
+            )
+            results[width or 'full'] = {
+                'ms_per_frame': round(elapsed * 1000 / (len(grays) * repeat), 2),
+                'recall': round(found / total_faces, 3) if total_faces else None
+            }
+    finally:
+        fd.DETECTION_WIDTH = configured
+    return results
+
+def bench_tracking(payloads, repeat=3):
+    """Frames/sec for one session streaming the frame set, with and without detect-then-track"""
+    results = {}
+    max_diff, fd.result_cache.max_diff = fd.result_cache.max_diff, 0
+    try:
+        for label, sid in (('detect_every_frame', None), ('detect_then_track', 'benchmark')):
+            fd.forget_session(sid)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for payload in payloads:
+                    fd.process_batch([(sid, payload, None)])
+            results[label] = round(len(payloads) * repeat / (time.perf_counter() - start), 1)
+    finally:
+        fd.result_cache.max_diff = max_diff
+    return results
+
+def bench_cache(payloads, hold=10, repeat=3):
+    """Frames/sec for a still candidate (each frame sent ``hold`` times), with and without the result cache"""
+    frames = [payload for payload in payloads for _ in range(hold)]
+    results = {}
+    max_diff = fd.result_cache.max_diff
+    try:
+        for label, diff in (('uncached', 0), ('cached', max_diff or 2.0)):
+            fd.result_cache.max_diff = diff
+            fd.forget_session('benchmark')
+            hits = fd.result_cache.hits
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for payload in frames:
+                    fd.process_batch([('benchmark', payload, None)])
+            results[label] = round(len(frames) * repeat / (time.perf_counter() - start), 1)
+        results['hit_rate'] = round((fd.result_cache.hits - hits) / (len(frames) * repeat), 3)
+    finally:
+        fd.result_cache.max_diff = max_diff
+        fd.forget_session('benchmark')
+    return results
+
+def bench_engine(payloads, workers, batch_window_ms, max_batch, repeat=3):
+    """Frames/sec per core through a worker pool, including queueing and IPC"""
+    engine = DetectionEngine(fd.process_batch, initializer=fd.initialize_detectors, workers=workers,
+                             batch_window_ms=batch_window_ms, max_batch=max_batch)
+    engine.start()
+    try:
+        # Warm up so worker start-up and model loading are not timed
+        for future in [engine.submit(None, payload, None) for payload in payloads[:workers * 2]]:
+            future.result()
+
+        start = time.perf_counter()
+        futures = [engine.submit(None, payload, None) for _ in range(repeat) for payload in payloads]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        engine.stop()
+    return round(len(futures) / elapsed / workers, 1)
+
+def run_socket_client(url, payloads, duration, latencies, errors, lock):
+    """One simulated candidate: send a frame, wait for its result, repeat until the time is up.
+
+    Frames cycle through ``payloads`` so consecutive frames differ and a
+    server with the result cache on still runs detection on each of them.
+    """
+    import socketio
+
+    client = socketio.Client(reconnection=False)
+    started = threading.Event()
+    result_ready = threading.Event()
+    client.on('status', lambda data: started.set() if 'started' in data.get('message', '') else None)
+    client.on('detection_result', lambda result: result_ready.set())
+
+    samples = []
+    failures = 0
+    try:
+        client.connect(url, transports=['websocket'])
+        client.emit('start_detection')
+        started.wait(timeout=5)
+
+        # Untimed warm-up frame, so worker start-up does not land in the percentiles
+        client.emit('process_frame', {'frame': payloads[0]})
+        result_ready.wait(timeout=30)
+
+        deadline = time.perf_counter() + duration
+        sent_frames = 0
+        while time.perf_counter() < deadline:
+            result_ready.clear()
+            sent_frames += 1
+            sent = time.perf_counter()
+            client.emit('process_frame', {'frame': payloads[sent_frames % len(payloads)]})
+            if result_ready.wait(timeout=10):
+                samples.append(time.perf_counter() - sent)
+            else:
+                failures += 1
+    except Exception:
+        failures += 1
+    finally:
+        if client.connected:
+            client.disconnect()
+
+    with lock:
+        latencies.extend(samples)
+        errors.append(failures)
+
+def bench_sockets(url, payloads, clients, duration):
+    """Drive the Socket.IO server with N concurrent clients; end-to-end latency and aggregate FPS"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_socket_client,
+                         args=(url, payloads[i:] + payloads[:i], duration, latencies, errors, lock))
+        for i in range(clients)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    summary = latency_summary(latencies)
+    summary.update({
+        'clients': clients,
+        'duration_s': round(elapsed, 2),
+        'aggregate_fps': round(len(latencies) / elapsed, 1),
+        'timeouts_or_errors': sum(errors)
+    })
+    return summary
+
+def bench_session_scaling(url, payloads, client_counts, duration, latency_budget_ms):
+    """Step through increasing client counts; sessions sustained = the largest count within the p95 budget"""
+    runs = {}
+    sustained = 0
+    for clients in client_counts:
+        run = runs[clients] = bench_sockets(url, payloads, clients, duration)
+        within_budget = run['count'] > 0 and run['p95_ms'] <= latency_budget_ms and not run['timeouts_or_errors']
+        run['within_budget'] = within_budget
+        if within_budget:
+            sustained = max(sustained, clients)
+    return {'latency_budget_ms': latency_budget_ms, 'sustained_sessions': sustained, 'runs': runs}
+
+def wait_for_server(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url + '/health', timeout=2) as response:
+                return json.load(response)
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit(f"Server at {url} did not become healthy within {timeout}s")
+
+SERVER_SCRIPTS = {'threading': 'face_detection.py', 'async': 'async_server.py'}
+
+def launch_server(port, mode='threading'):
+    """Start the threading (face_detection.py) or async (async_server.py) server on the given port.
+
+    The result cache is turned off so the sockets suite measures detection, not cache hits.
+    """
+    env = dict(os.environ, PORT=str(port), RESULT_CACHE_MAX_DIFF='0')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), SERVER_SCRIPTS[mode])
+    return subprocess.Popen([sys.executable, script], env=env, cwd=os.path.dirname(script),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def collect_metadata(args, payloads):
+    """Environment and settings recorded alongside the results"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'dlib': getattr(fd.dlib, '__version__', None),
+        'detectors': {'dlib': fd.detector is not None, 'opencv': fd.face_cascade is not None},
+        'frames': {
+            'source': args.frames or 'synthetic',
+            'seed': None if args.frames else args.seed,
+            'count': len(payloads),
+            'mean_bytes': int(np.mean([len(payload) for payload in payloads]))
+        },
+        'settings': {
+            'repeat': args.repeat,
+            'tracking_mode': fd.TRACKING_MODE,
+            'tracking_interval': fd.TRACKING_INTERVAL,
+            'detection_width': fd.DETECTION_WIDTH,
+            'face_fraction': [fd.FACE_MIN_FRACTION, fd.FACE_MAX_FRACTION]
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the face detection backend')
+    parser.add_argument('--frames', help='Directory of recorded .jpg/.png frames (default: synthetic)')
+    parser.add_argument('--count', type=int, default=64, help='Number of frames to use')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for synthetic frames')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the frame set')
+    parser.add_argument('--suites', default='stages,batching,resolution,tracking,cache,engine',
+                        help=f"Comma-separated suites to run, from: {', '.join(SUITES)}")
+    parser.add_argument('--batch-sizes', default='1,4,8,16', help='Comma-separated micro-batch sizes')
+    parser.add_argument('--widths', default='0,480,400,320,240', help='Detection widths to compare (0 = full resolution)')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes for the pool benchmark')
+    parser.add_argument('--batch-window-ms', type=float, default=10, help='Batch window for the pool benchmark')
+    parser.add_argument('--server', default='http://localhost:5000', help='Socket.IO server for the sockets suite')
+    parser.add_argument('--launch', action='store_true', help='Start the server for the sockets suite')
+    parser.add_argument('--server-mode', choices=sorted(SERVER_SCRIPTS), default='threading',
+                        help='Server started by --launch')
+    parser.add_argument('--clients', default='8', help='Comma-separated concurrent client counts to step through')
+    parser.add_argument('--latency-budget-ms', type=float, default=250,
+                        help='p95 latency a client count must stay within to count as sustained')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds each client streams for')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(',')]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+    fd.initialize_detectors()
+    payloads = load_frames(args.frames, args.count, seed=args.seed)
+    report = {'meta': collect_metadata(args, payloads), 'results': {}}
+    results = report['results']
+
+    if 'stages' in suites:
+        results['stages'] = bench_stages(payloads, args.repeat)
+        print("\nPer-stage latency (ms)")
+        for stage, stats in results['stages'].items():
+            print(f"  {stage:<15} : mean {stats['mean_ms']:7.3f}  p50 {stats['p50_ms']:7.3f}  "
+                  f"p95 {stats['p95_ms']:7.3f}  p99 {stats['p99_ms']:7.3f}")
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    if 'batching' in suites:
+        results['batching'] = bench_batching(payloads, batch_sizes, args.repeat)
+        print("\nThroughput (frames/sec per core)")
+        print(f"  per-frame path : {results['batching']['per_frame']:8.1f}")
+        for batch_size, fps in results['batching']['batched'].items():
+            speedup = fps / results['batching']['per_frame']
+            print(f"  batch of {batch_size:<5} : {fps:8.1f}  ({speedup:.2f}x)")
+
+    if 'resolution' in suites and fd.detector is None and fd.face_cascade is None:
+        print("\nDetection resolution: skipped, no face detector loaded (install dlib or add the Haar cascade)")
+    elif 'resolution' in suites:
+        widths = [int(width) for width in args.widths.split(',')]
+        results['resolution'] = bench_resolution(payloads, widths, args.repeat)
+        print("\nDetection resolution (speed / recall vs full resolution)")
+        for width, stats in results['resolution'].items():
+            recall = 'n/a (no faces in reference)' if stats['recall'] is None else f"{stats['recall']:.3f}"
+            print(f"  width {str(width):<5} : {stats['ms_per_frame']:7.2f} ms/frame  recall {recall}")
+
+    if 'tracking' in suites:
+        tracking = results['tracking'] = bench_tracking(payloads, args.repeat)
+        print(f"\nSingle session, tracking mode '{fd.TRACKING_MODE}' (frames/sec)")
+        print(f"  detect every frame : {tracking['detect_every_frame']:8.1f}")
+        print(f"  detect then track  : {tracking['detect_then_track']:8.1f}  "
+              f"({tracking['detect_then_track'] / tracking['detect_every_frame']:.2f}x)")
+
+    if 'cache' in suites:
+        cache = results['cache'] = bench_cache(payloads, repeat=args.repeat)
+        print("\nStill candidate, each frame sent 10 times (frames/sec)")
+        print(f"  detect every frame : {cache['uncached']:8.1f}")
+        print(f"  result cache       : {cache['cached']:8.1f}  ({cache['cached'] / cache['uncached']:.2f}x, "
+              f"hit rate {cache['hit_rate']:.2f})")
+
+    if 'engine' in suites:
+        unbatched = bench_engine(payloads, args.workers, 0, 1, args.repeat)
+        batched = bench_engine(payloads, args.workers, args.batch_window_ms, max(batch_sizes), args.repeat)
+        results['engine'] = {'workers': args.workers, 'per_frame_dispatch_fps_per_core': unbatched,
+                             'micro_batched_fps_per_core': batched}
+        print(f"\nWorker pool, {args.workers} workers (frames/sec per core)")
+        print(f"  per-frame dispatch : {unbatched:8.1f}")
+        print(f"  micro-batched      : {batched:8.1f}  ({batched / unbatched:.2f}x)")
+
+    if 'sockets' in suites:
+        server = None
+        if args.launch:
+            port = int(args.server.rsplit(':', 1)[-1].rstrip('/'))
+            server = launch_server(port, args.server_mode)
+        client_counts = [int(count) for count in args.clients.split(',')]
+        try:
+            health = wait_for_server(args.server.rstrip('/'))
+            sockets = results['sockets'] = bench_session_scaling(args.server, payloads, client_counts,
+                                                                  args.duration, args.latency_budget_ms)
+            sockets['server_mode'] = health.get('mode', 'threading')
+            sockets['server_engine'] = wait_for_server(args.server.rstrip('/')).get('engine')
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        print(f"\nSocket.IO load, {sockets['server_mode']} server, {args.duration:.0f}s per client count")
+        for clients, run in sockets['runs'].items():
+            latency = (f"p50 {run['p50_ms']:7.1f}  p95 {run['p95_ms']:7.1f}  p99 {run['p99_ms']:7.1f} ms"
+                       if run['count'] else 'no results')
+            print(f"  {clients:>4} clients : {latency}  {run['aggregate_fps']:7.1f} frames/sec  "
+                  f"{run['timeouts_or_errors']} timeouts/errors{'' if run['within_budget'] else '  (over budget)'}")
+        print(f"  sustained sessions within p95 {args.latency_budget_ms:.0f} ms : {sockets['sustained_sessions']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+
+def _collect_batch(tasks, batch_window, max_batch):
+    """Block for one task, then keep collecting until the window closes or the batch is full.
+
+    Returns (frames, discarded_keys, stopping). Session discards are applied
+    after the batch so they never race a frame of the same session.
+    """
+    batch, discards = [], []
+    deadline = None
+    while len(batch) < max_batch:
+        if deadline is None:
+            task = tasks.get()
+        else:
+            remaining = deadline - time.perf_counter()
+            try:
+                task = tasks.get(timeout=remaining) if remaining > 0 else tasks.get_nowait()
+            except queue.Empty:
+                break
+
+        if task is None:
+            return batch, discards, True
+
+        task_id, payload = task
+        if task_id is None:
+            discards.append(payload)
+            if not batch:
+                return batch, discards, False
+            continue
+
+        batch.append(task)
+        if deadline is None:
+            deadline = time.perf_counter() + batch_window
+    return batch, discards, False
+
+
+def _worker_main(worker_id, handler, initializer, discard, tasks, results, batch_window, max_batch):
+    """Worker process loop: load the models once, then serve batches until told to stop"""
+    if initializer is not None:
+        initializer()
+
+    stopping = False
+    while not stopping:
+        batch, discards, stopping = _collect_batch(tasks, batch_window, max_batch)
+
+        if batch:
+            task_ids = [task_id for task_id, _ in batch]
+            # Tell the engine the batch is being worked on; its hang deadline runs from here
+            results.put((worker_id, None, task_ids))
+            started = time.perf_counter()
+            try:
+                batch_results = handler([args for _, args in batch])
+            except Exception as e:
+                batch_results = [{'error': str(e)} for _ in batch]
+            busy = time.perf_counter() - started
+            results.put((worker_id, busy, list(zip(task_ids, batch_results))))
+
+        if discard is not None:
+            for key in discards:
+                discard(key)
+
+
+class DetectionEngine:
+    """Runs detection in a pool of worker processes so slow frames never block the socket handlers.
+
+    Each worker calls ``initializer`` once (loading its own dlib detector / Haar
+    cascade). It then collects frames for up to ``batch_window_ms`` (at most
+    ``max_batch`` of them, from any session) and runs ``handler(list_of_args)``
+    once per batch, which returns one result per frame. With ``workers=0`` the
+    handler runs inline in the caller's thread on single-frame batches.
+
+    Frames submitted with a ``key`` (the session id) always go to the same
+    worker, so per-session state such as trackers can live in that worker;
+    ``discard(key)`` tells it to drop that state. Frames without a key go to
+    the least busy worker.
+
+    A worker that dies (out of memory, a crash in a native detector) is
+    restarted with fresh state, and the frames it held fail with a
+    RuntimeError. A worker still on a batch ``result_timeout`` seconds after
+    it picked it up is taken as hung: it is replaced the same way and its
+    frames fail with a TimeoutError, so no caller waits forever. Frames
+    waiting behind a busy but healthy worker are never timed out.
+
+    Restarts back off exponentially from ``restart_backoff`` seconds (up to a
+    minute) while a worker keeps dying without returning a result, and after
+    ``max_restarts`` such deaths in a row (e.g. a model that fails to load)
+    the worker is marked failed and left down. Frames for a worker waiting to
+    restart queue up for its replacement; a failed worker's sessions move to
+    the others. ``stats()`` reports each worker's state.
+    """
+
+    def __init__(self, handler, initializer=None, discard=None, workers=None, batch_window_ms=10, max_batch=16,
+                 result_timeout=30.0, max_restarts=5, restart_backoff=0.5):
+        self.handler = handler
+        self.initializer = initializer
+        self.discard_handler = discard
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.batch_window_ms = batch_window_ms
+        self.max_batch = max_batch
+        self.result_timeout = result_timeout
+        self.max_restarts = max_restarts
+        self.restart_backoff = restart_backoff
+
+        self._ctx = None
+        self._running = False
+        self._queues = []
+        self._results = None
+        self._processes = []
+        self._collector = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._started_at = None
+        self._worker_stats = []
+        self._last_check = 0.0
+        # Per worker: 'running', 'restarting' or 'failed', deaths since its last result, when to respawn
+        self._states = []
+        self._deaths = []
+        self._restart_at = []
+        self.restarts = 0
+
+    def start(self):
+        """Spawn the worker processes and the result collector thread"""
+        self._started_at = time.time()
+        if self.workers <= 0:
+            return
+
+        self._ctx = multiprocessing.get_context('spawn')
+        self._results = self._ctx.Queue()
+        self._worker_stats = [{'frames': 0, 'batches': 0, 'busy_seconds': 0.0, 'in_flight': 0}
+                              for _ in range(self.workers)]
+        self._queues = [None] * self.workers
+        self._processes = [None] * self.workers
+        self._states = ['running'] * self.workers
+        self._deaths = [0] * self.workers
+        self._restart_at = [0.0] * self.workers
+        for worker_id in range(self.workers):
+            self._queues[worker_id] = self._ctx.Queue()
+            self._spawn(worker_id)
+
+        self._running = True
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+        print(f"Detection engine started with {self.workers} worker processes")
+
+    def _spawn(self, worker_id):
+        """Start (or replace) one worker process on its current task queue"""
+        tasks = self._queues[worker_id]
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.handler, self.initializer, self.discard_handler, tasks, self._results,
+                  self.batch_window_ms / 1000, self.max_batch),
+            daemon=True
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def stop(self):
+        """Ask every worker to exit, wait for them and fail any frames still pending"""
+        self._running = False
+        for tasks in self._queues:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+        if self._collector is not None:
+            self._collector.join(timeout=5)
+        self._processes = []
+        self._queues = []
+
+        with self._lock:
+            pending = [future for future, _, _ in self._pending.values()]
+            self._pending.clear()
+        for future in pending:
+            future.set_exception(RuntimeError('Detection engine stopped'))
+
+    def _worker_for(self, key):
+        running = [worker_id for worker_id, state in enumerate(self._states) if state != 'failed']
+        if not running:
+            raise RuntimeError('No detection workers running')
+        if key is not None:
+            # The same worker as long as no worker has failed for good
+            return running[zlib.crc32(str(key).encode()) % len(running)]
+        return min(running, key=lambda worker_id: self._worker_stats[worker_id]['in_flight'])
+
+    def submit(self, *args, key=None):
+        """Queue a frame for detection and return a Future for its result"""
+        future = Future()
+        if self.workers <= 0:
+            try:
+                future.set_result(self.handler([args])[0])
+            except Exception as e:
+                future.set_result({'error': str(e)})
+            return future
+
+        with self._lock:
+            try:
+                worker_id = self._worker_for(key)
+            except RuntimeError as e:
+                future.set_exception(e)
+                return future
+            task_id = self._next_id
+            self._next_id += 1
+            # future, worker, when the worker started on it (None while queued)
+            self._pending[task_id] = [future, worker_id, None]
+            self._worker_stats[worker_id]['in_flight'] += 1
+            # Under the lock, so a worker being replaced never gets a frame on its old queue
+            self._queues[worker_id].put((task_id, args))
+        return future
+
+    def discard(self, key):
+        """Drop any per-session state held for ``key``"""
+        if self.discard_handler is None:
+            return
+        if self.workers <= 0:
+            self.discard_handler(key)
+            return
+        with self._lock:
+            try:
+                self._queues[self._worker_for(key)].put((None, key))
+            except RuntimeError:
+                pass
+
+    def _collect_results(self):
+        while self._running:
+            try:
+                worker_id, busy, batch_results = self._results.get(timeout=0.5)
+            except queue.Empty:
+                busy = batch_results = None
+            except (EOFError, OSError):
+                break
+
+            futures = []
+            if busy is None and batch_results is not None:
+                # A worker picked up a batch: start its frames' hang deadline
+                now = time.monotonic()
+                with self._lock:
+                    for task_id in batch_results:
+                        if task_id in self._pending:
+                            self._pending[task_id][2] = now
+            elif batch_results is not None:
+                with self._lock:
+                    for task_id, result in batch_results:
+                        # Frames that already failed (timed out) have no entry left
+                        pending = self._pending.pop(task_id, None)
+                        if pending is not None:
+                            futures.append((pending[0], result))
+                            self._worker_stats[pending[1]]['in_flight'] -= 1
+                    # A worker that returns results has started up fine
+                    self._deaths[worker_id] = 0
+                    stats = self._worker_stats[worker_id]
+                    stats['frames'] += len(batch_results)
+                    stats['batches'] += 1
+                    stats['busy_seconds'] += busy
+
+            # Fan the batch back out to each frame's caller
+            for future, result in futures:
+                future.set_result(result)
+
+            for future, error in self._check_workers():
+                future.set_exception(error)
+
+    def _check_workers(self):
+        """Restart dead and hung workers (with backoff) and return the (future, error) pairs to fail"""
+        now = time.monotonic()
+        if now - self._last_check < 0.5:
+            return []
+        self._last_check = now
+
+        failed = []
+        with self._lock:
+            if not self._running:
+                return []
+            errors = {}
+            for worker_id, process in enumerate(self._processes):
+                if self._states[worker_id] == 'running' and not process.is_alive():
+                    print(f"Detection worker {worker_id} died (exit code {process.exitcode})")
+                    errors[worker_id] = RuntimeError(f'Detection worker {worker_id} died')
+            for future, worker_id, started in self._pending.values():
+                if worker_id not in errors and started is not None and now - started > self.result_timeout:
+                    print(f"Detection worker {worker_id} gave no result for {self.result_timeout:g}s")
+                    errors[worker_id] = TimeoutError(f'No detection result after {self.result_timeout:g}s')
+                    self._processes[worker_id].terminate()
+                    self._processes[worker_id].join(timeout=1)
+
+            for worker_id in errors:
+                # Frames the dead process held are failed below; new ones wait on a fresh queue
+                self._queues[worker_id] = self._ctx.Queue()
+                self._deaths[worker_id] += 1
+                if self._deaths[worker_id] > self.max_restarts:
+                    print(f"Detection worker {worker_id} failed {self._deaths[worker_id]} times in a row, giving up")
+                    self._states[worker_id] = 'failed'
+                else:
+                    delay = min(self.restart_backoff * 2 ** (self._deaths[worker_id] - 1), 60.0)
+                    print(f"Restarting detection worker {worker_id} in {delay:g}s")
+                    self._states[worker_id] = 'restarting'
+                    self._restart_at[worker_id] = now + delay
+            for worker_id, state in enumerate(self._states):
+                if state == 'restarting' and now >= self._restart_at[worker_id]:
+                    self._spawn(worker_id)
+                    self._states[worker_id] = 'running'
+                    self.restarts += 1
+            for task_id, (future, worker_id, _) in list(self._pending.items()):
+                if worker_id in errors:
+                    del self._pending[task_id]
+                    self._worker_stats[worker_id]['in_flight'] -= 1
+                    failed.append((future, errors[worker_id]))
+        return failed
+
+    def stats(self):
+        """Queue depth and per-worker utilisation for the /health endpoint"""
+        uptime = time.time() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            workers = [{
+                'worker': worker_id,
+                'alive': worker_id < len(self._processes) and self._processes[worker_id].is_alive(),
+                'state': self._states[worker_id],
+                'consecutive_failures': self._deaths[worker_id],
+                'queue_depth': stats['in_flight'],
+                'frames': stats['frames'],
+                'mean_batch_size': round(stats['frames'] / stats['batches'], 2) if stats['batches'] else 0.0,
+                'busy_seconds': round(stats['busy_seconds'], 3),
+                'utilisation': round(stats['busy_seconds'] / uptime, 3) if uptime > 0 else 0.0
+            } for worker_id, stats in enumerate(self._worker_stats)]
+            queue_depth = len(self._pending)
+            failed = self._states.count('failed')
+
+        return {
+            'mode': 'process_pool' if self.workers > 0 else 'inline',
+            'workers': self.workers,
+            'batch_window_ms': self.batch_window_ms,
+            'max_batch': self.max_batch,
+            'queue_depth': queue_depth,
+            'restarts': self.restarts,
+            'failed_workers': failed,
+            'uptime_seconds': round(uptime, 1),
+            'worker_stats': workers
+        }
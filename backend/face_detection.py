@@ -3,11 +3,17 @@ import numpy as np
 import dlib
 import base64
 import json
-from flask import Flask, request, jsonify
+import os
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import threading
 import time
+from detection_engine import DetectionEngine
+from backpressure import FrameMailboxes
+from face_tracking import SessionTracker
+from result_cache import ResultCache
+import metrics
 
 app = Flask(__name__)
 CORS(app)
@@ -18,6 +24,35 @@ detector = None
 face_cascade = None
 processing_active = False
 
+# Detect-then-track settings; TRACKING_MODE is 'correlation', 'roi' or 'off'
+TRACKING_MODE = os.environ.get('TRACKING_MODE', 'correlation')
+TRACKING_INTERVAL = int(os.environ.get('TRACKING_INTERVAL', 10))
+TRACKING_MIN_CONFIDENCE = float(os.environ.get('TRACKING_MIN_CONFIDENCE', 7.0))
+
+# Per-session trackers, held by whichever worker the session is pinned to
+trackers = {}
+
+# Near-identical frames reuse the session's last result: RESULT_CACHE_MAX_DIFF is the
+# mean gray-level change (on a 16x12 thumbnail) below which a frame counts as unchanged,
+# 0 disables the cache; RESULT_CACHE_MAX_CELL_DIFF is the most any one thumbnail cell may change
+result_cache = ResultCache(
+    max_diff=float(os.environ.get('RESULT_CACHE_MAX_DIFF', 2.0)),
+    max_cell_diff=float(os.environ.get('RESULT_CACHE_MAX_CELL_DIFF', 20.0)),
+    ttl_seconds=float(os.environ.get('RESULT_CACHE_TTL_SECONDS', 5.0)),
+    max_sessions=int(os.environ.get('RESULT_CACHE_MAX_SESSIONS', 1024))
+)
+
+# Expected face width in a webcam exam, as a fraction of the frame width
+FACE_MIN_FRACTION = float(os.environ.get('FACE_MIN_FRACTION', 0.2))
+FACE_MAX_FRACTION = float(os.environ.get('FACE_MAX_FRACTION', 0.8))
+# Width frames are downscaled to before detection; unset derives it from the
+# smallest expected face, 0 detects at full resolution
+DETECTION_WIDTH = int(os.environ['DETECTION_WIDTH']) if 'DETECTION_WIDTH' in os.environ else None
+# Haar pyramid levels spanning the expected face sizes (sets the scale factor)
+HAAR_PYRAMID_LEVELS = int(os.environ.get('HAAR_PYRAMID_LEVELS', 10))
+# Smallest face Dlib's HOG detector finds without upsampling
+DLIB_MIN_FACE = 80
+
 def initialize_detectors():
     global detector, face_cascade
     try:
@@ -40,13 +75,14 @@ def initialize_detectors():
         print(f"OpenCV Haar cascade initialization failed: {e}")
         face_cascade = None
 
-def detect_faces_opencv(frame):
+def detect_faces_opencv(frame, min_size=None, max_size=None, scale_factor=1.3):
     """Detect faces using OpenCV Haar cascades"""
     if face_cascade is None:
         return []
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+    gray = to_gray(frame)
+    faces = face_cascade.detectMultiScale(gray, scale_factor, 5,
+                                          minSize=min_size or (0, 0), maxSize=max_size or (0, 0))
 
     detected_faces = []
     for (x, y, w, h) in faces:
@@ -65,7 +101,7 @@ def detect_faces_dlib(frame):
     if detector is None:
         return []
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(frame)
     faces = detector(gray)
 
     detected_faces = []
@@ -85,24 +121,112 @@ def detect_faces_dlib(frame):
 
     return detected_faces
 
-def process_frame(frame_data):
+def parse_shape(shape):
+    """Parse a raw frame shape header ("480,640,3", "480x640" or a list)"""
+    if shape is None:
+        return None
+    if isinstance(shape, str):
+        shape = shape.replace('x', ',').split(',')
+    shape = tuple(int(dim) for dim in shape)
+    if len(shape) not in (2, 3) or (len(shape) == 3 and shape[2] not in (1, 3)):
+        raise ValueError(f'Unsupported frame shape {shape}')
+    return shape
+
+def decode_frame(frame_data, shape=None):
+    """Decode a frame from binary (encoded or raw uint8) or base64 data-URL input"""
+    if isinstance(frame_data, str):
+        # Base64 fallback, with or without the data-URL prefix
+        frame_data = base64.b64decode(frame_data.split(',', 1)[-1])
+
+    # Wrap the payload without copying it
+    np_arr = np.frombuffer(frame_data, np.uint8)
+
+    shape = parse_shape(shape)
+    if shape is None:
+        # JPEG/WebP/PNG bytes
+        return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+    # Raw BGR or gray pixels described by the shape header
+    if np_arr.size != int(np.prod(shape)):
+        raise ValueError(f'Frame has {np_arr.size} bytes, expected {int(np.prod(shape))} for shape {shape}')
+    frame = np_arr.reshape(shape)
+    if frame.ndim == 3 and frame.shape[2] == 1:
+        frame = frame[:, :, 0]
+    return frame
+
+def to_gray(frame):
+    """Return a grayscale view of the frame, converting only BGR input"""
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+# Grayscale buffers reused across batches, per thread and frame size
+_buffers = threading.local()
+
+def gray_buffer(size, slot, pool='gray'):
+    """Return the preallocated grayscale buffer for the given frame size and batch slot"""
+    if not hasattr(_buffers, 'pools'):
+        _buffers.pools = {}
+    buffers = _buffers.pools.setdefault((pool, size), [])
+    while len(buffers) <= slot:
+        buffers.append(np.empty(size, np.uint8))
+    return buffers[slot]
+
+def detection_scale(frame_width):
+    """Downscale factor for a frame of this width (never upscales)"""
+    if DETECTION_WIDTH == 0:
+        return 1.0
+    # By default, shrink until the smallest expected face just meets Dlib's minimum size
+    target = DETECTION_WIDTH or int(np.ceil(DLIB_MIN_FACE / FACE_MIN_FRACTION))
+    return min(1.0, target / frame_width)
+
+def haar_settings(frame_width):
+    """minSize, maxSize and scale factor for detectMultiScale from the expected face sizes"""
+    min_face = max(24, int(FACE_MIN_FRACTION * frame_width))
+    max_face = max(min_face + 1, int(FACE_MAX_FRACTION * frame_width))
+    scale_factor = (max_face / min_face) ** (1 / HAAR_PYRAMID_LEVELS)
+    return (min_face, min_face), (max_face, max_face), max(1.01, scale_factor)
+
+def run_detector(frame, frame_width=None):
+    """Try Dlib first, fallback to OpenCV, on a downscaled frame; returns None when no model is loaded.
+
+    Boxes are remapped to the coordinates of ``frame``. When ``frame`` is a crop,
+    ``frame_width`` is the width of the full frame it came from, so the crop is
+    scaled and face sizes bounded exactly like the full frame.
+    """
+    if detector is None and face_cascade is None:
+        return None
+
+    gray = to_gray(frame)
+    frame_width = frame_width or gray.shape[1]
+    scale = detection_scale(frame_width)
+    if scale < 1:
+        size = (max(1, round(gray.shape[0] * scale)), max(1, round(gray.shape[1] * scale)))
+        gray = cv2.resize(gray, size[::-1], dst=gray_buffer(size, 0, 'small'), interpolation=cv2.INTER_AREA)
+
+    if detector is not None:
+        faces = detect_faces_dlib(gray)
+    else:
+        min_size, max_size, scale_factor = haar_settings(frame_width * scale)
+        faces = detect_faces_opencv(gray, min_size, max_size, scale_factor)
+
+    # Map boxes back to original coordinates
+    if scale < 1:
+        for face in faces:
+            for key in ('x', 'y', 'width', 'height'):
+                face[key] = int(round(face[key] / scale))
+    return faces
+
+def process_frame(frame_data, shape=None):
     """Process a single frame for face detection"""
     try:
-        # Decode base64 image
-        img_data = base64.b64decode(frame_data.split(',')[1])
-        np_arr = np.frombuffer(img_data, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        frame = decode_frame(frame_data, shape)
 
         if frame is None:
             return {'error': 'Invalid image data'}
 
-        # Try Dlib first, fallback to OpenCV
-        faces = []
-        if detector is not None:
-            faces = detect_faces_dlib(frame)
-        elif face_cascade is not None:
-            faces = detect_faces_opencv(frame)
-        else:
+        faces = run_detector(frame)
+        if faces is None:
             return {'error': 'No face detection models available'}
 
         return {
@@ -114,33 +238,189 @@ def process_frame(frame_data):
     except Exception as e:
         return {'error': str(e)}
 
+def track_or_detect(sid, gray):
+    """Follow the session's face with its tracker, or run a full detection; returns (faces, tracked)"""
+    if sid is None or TRACKING_MODE == 'off':
+        return run_detector(gray), False
+
+    tracker = trackers.get(sid)
+    if tracker is None:
+        tracker = trackers[sid] = SessionTracker(run_detector, TRACKING_MODE, TRACKING_INTERVAL,
+                                                 TRACKING_MIN_CONFIDENCE)
+    return tracker.update(gray)
+
+def forget_session(sid):
+    """Drop the per-session state of a disconnected client"""
+    trackers.pop(sid, None)
+    result_cache.forget(sid)
+
+def error_result(message, error_type):
+    """Error result for one frame; carries the error type for /metrics when enabled"""
+    result = {'error': message}
+    if metrics.ENABLED:
+        result['_metrics'] = {'error_type': error_type}
+    return result
+
+def process_batch(frames):
+    """Process a batch of (sid, frame_data, shape) frames from many sessions, one result per frame.
+
+    With metrics enabled each result carries a ``_metrics`` sample (stage
+    timings and the detector used) that the server strips before emitting.
+    """
+    if detector is None and face_cascade is None:
+        return [error_result('No face detection models available', 'NoDetector') for _ in frames]
+
+    results = [None] * len(frames)
+    grays = []
+    slots = {}
+
+    # Decode and convert the whole batch into the reused grayscale buffers first...
+    for index, (sid, frame_data, shape) in enumerate(frames):
+        started = metrics.clock()
+        try:
+            frame = decode_frame(frame_data, shape)
+        except Exception as e:
+            results[index] = error_result(str(e), type(e).__name__)
+            continue
+
+        if frame is None:
+            results[index] = error_result('Invalid image data', 'InvalidImage')
+            continue
+
+        decoded = metrics.clock()
+        if frame.ndim == 3:
+            size = frame.shape[:2]
+            slot = slots.get(size, 0)
+            slots[size] = slot + 1
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray_buffer(size, slot))
+        timings = (decoded - started, metrics.clock() - decoded)
+        grays.append((index, sid, frame, timings))
+
+    # ...then run the detector over it back to back, skipping frames that have not changed
+    for index, sid, gray, (decode_time, gray_time) in grays:
+        started = metrics.clock()
+        try:
+            cached, thumb = result_cache.lookup(sid, gray)
+            if cached is not None:
+                results[index] = cached
+                selected = 'cache'
+            else:
+                faces, tracked = track_or_detect(sid, gray)
+                results[index] = {
+                    'faces': faces,
+                    'face_count': len(faces),
+                    'tracked': tracked,
+                    'cached': False,
+                    'timestamp': time.time()
+                }
+                result_cache.store(sid, thumb, results[index])
+                selected = 'tracker' if tracked else ('dlib' if detector is not None else 'haar')
+        except Exception as e:
+            results[index] = error_result(str(e), type(e).__name__)
+            continue
+
+        if metrics.ENABLED:
+            results[index]['_metrics'] = {
+                'decode': decode_time,
+                'grayscale': gray_time,
+                'detect': metrics.clock() - started,
+                'detector': selected
+            }
+
+    return results
+
+# Detection runs in worker processes; DETECTION_WORKERS=0 runs it inline instead.
+# Workers micro-batch frames from all sessions arriving within the batch window.
+engine = DetectionEngine(
+    process_batch,
+    initializer=initialize_detectors,
+    discard=forget_session,
+    workers=int(os.environ['DETECTION_WORKERS']) if 'DETECTION_WORKERS' in os.environ else None,
+    batch_window_ms=float(os.environ.get('DETECTION_BATCH_WINDOW_MS', 10)),
+    max_batch=int(os.environ.get('DETECTION_MAX_BATCH', 16)),
+    result_timeout=float(os.environ.get('DETECTION_RESULT_TIMEOUT_SECONDS', 30)),
+    max_restarts=int(os.environ.get('DETECTION_MAX_RESTARTS', 5))
+)
+
+# One frame in flight per client; newer frames replace the one waiting
+mailboxes = FrameMailboxes()
+
+def record_metrics(result):
+    """Fold a result's worker-side metrics sample into the counters and strip it from the result"""
+    sample = result.pop('_metrics', None)
+    if sample is None:
+        return
+    if 'error_type' in sample:
+        metrics.ERRORS.inc(type=sample['error_type'])
+        return
+
+    metrics.FRAMES_PROCESSED.inc()
+    metrics.DETECTOR_SELECTIONS.inc(detector=sample['detector'])
+    for stage in ('decode', 'grayscale', 'detect'):
+        metrics.STAGE_LATENCY.observe(sample[stage], stage=stage)
+
+def render_metrics():
+    """Registered metrics plus the per-session frame counts, in Prometheus text format"""
+    totals = mailboxes.totals()
+    lines = [
+        '# HELP proctoring_frames_dropped_total Stale frames replaced before they were processed',
+        '# TYPE proctoring_frames_dropped_total counter',
+        f"proctoring_frames_dropped_total {totals['frames_dropped']}",
+        '# HELP proctoring_session_frames Frames processed and dropped for each connected session',
+        '# TYPE proctoring_session_frames gauge'
+    ]
+    for sid, (processed, dropped) in mailboxes.session_counts().items():
+        lines.append(f'proctoring_session_frames{{sid="{sid}",outcome="processed"}} {processed}')
+        lines.append(f'proctoring_session_frames{{sid="{sid}",outcome="dropped"}} {dropped}')
+    return metrics.render(lines)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'detectors': {
+    stats = engine.stats()
+    return jsonify({'status': 'degraded' if stats['failed_workers'] else 'healthy', 'detectors': {
         'dlib': detector is not None,
         'opencv': face_cascade is not None
-    }})
+    }, 'engine': stats, 'sessions': mailboxes.totals()})
 
 @app.route('/detect', methods=['POST'])
 def detect_faces():
     try:
-        data = request.get_json()
-        if not data or 'frame' not in data:
-            return jsonify({'error': 'No frame data provided'}), 400
+        if request.is_json:
+            data = request.get_json()
+            if not data or 'frame' not in data:
+                return jsonify({'error': 'No frame data provided'}), 400
 
-        result = process_frame(data['frame'])
+            result = engine.submit(None, data['frame'], data.get('shape')).result()
+            record_metrics(result)
+        else:
+            # Binary body: encoded image bytes, or raw pixels with an X-Frame-Shape header
+            frame_data = request.get_data(cache=False)
+            if not frame_data:
+                return jsonify({'error': 'No frame data provided'}), 400
+
+            result = engine.submit(None, frame_data, request.headers.get('X-Frame-Shape')).result()
+            record_metrics(result)
         return jsonify(result)
 
     except Exception as e:
+        metrics.ERRORS.inc(type=type(e).__name__)
         return jsonify({'error': str(e)}), 500
 
 @socketio.on('connect')
 def handle_connect():
+    metrics.ACTIVE_SOCKETS.inc()
     print('Client connected')
     emit('status', {'message': 'Connected to face detection service'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    mailboxes.remove(request.sid)
+    engine.discard(request.sid)
+    metrics.ACTIVE_SOCKETS.dec()
     print('Client disconnected')
 
 @socketio.on('start_detection')
@@ -155,18 +435,77 @@ def handle_stop_detection():
     processing_active = False
     emit('status', {'message': 'Face detection stopped'})
 
+def unpack_frame_message(data):
+    """Split a process_frame message into (frame_data, shape)"""
+    if isinstance(data, dict) and 'frame' in data:
+        data, shape = data['frame'], data.get('shape')
+    else:
+        shape = None
+
+    if isinstance(data, memoryview):
+        # Frames are pickled over to the workers, which memoryviews don't support
+        data = bytes(data)
+    if isinstance(data, (bytes, bytearray, str)):
+        return data, shape
+    return None, None
+
 @socketio.on('process_frame')
 def handle_process_frame(data):
     if not processing_active:
         return
 
-    if 'frame' in data:
-        result = process_frame(data['frame'])
-        emit('detection_result', result)
+    frame_data, shape = unpack_frame_message(data)
+    if frame_data is None:
+        return
+
+    # Only enqueue here; if this client already has a frame in flight the newest one waits
+    frame = mailboxes.offer(request.sid, (frame_data, shape))
+    if frame is not None:
+        dispatch_frame(request.sid, frame)
+
+def dispatch_frame(sid, frame):
+    """Send a session's frames to the engine until its mailbox is empty, emitting each result.
+
+    A worker's result arrives on the engine's collector thread, which picks up
+    the next frame from there. Inline results (DETECTION_WORKERS=0) are already
+    done, so those frames are drained in this loop instead of from the future's
+    callback, which would recurse once per queued frame.
+    """
+    while frame is not None:
+        submitted = time.perf_counter()
+        future = engine.submit(sid, *frame, key=sid)
+        if not future.done():
+            future.add_done_callback(lambda done: dispatch_frame(sid, finish_frame(sid, submitted, done)))
+            return
+        frame = finish_frame(sid, submitted, future)
+
+def finish_frame(sid, submitted, future):
+    """Emit a frame's result and return the session's next frame, if one is waiting"""
+    service_time = time.perf_counter() - submitted
+    next_frame = mailboxes.complete(sid, service_time)
+    try:
+        result = future.result()
+    except Exception as e:
+        # Still emit, so the client sees the failure and its next frame goes through
+        result = error_result(str(e), type(e).__name__)
+
+    record_metrics(result)
+    metrics.STAGE_LATENCY.observe(service_time, stage='service')
+    result.update(mailboxes.stats(sid))
+    with metrics.timer(metrics.STAGE_LATENCY, stage='emit'):
+        socketio.emit('detection_result', result, to=sid)
+    return next_frame
 
 if __name__ == '__main__':
     print("Initializing face detection models...")
     initialize_detectors()
+    engine.start()
 
     print("Starting Flask-SocketIO server...")
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    # The reloader would re-run this script and start a second worker pool.
+    # allow_unsafe_werkzeug lets the dev server start without a TTY (e.g. from benchmark.py --launch).
+    try:
+        socketio.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=True, use_reloader=False,
+                     allow_unsafe_werkzeug=True)
+    finally:
+        engine.stop()
@@ -0,0 +1,117 @@
+import numpy as np
+
+try:
+    import dlib
+except ImportError:
+    dlib = None
+
+
+class SessionTracker:
+    """Detect-then-track state for one session.
+
+    After a full-frame detection that finds exactly one face, the following
+    frames follow that face cheaply until ``redetect_interval`` frames have
+    passed or tracking confidence drops, then a full detection runs again:
+
+    - ``correlation``: dlib's correlation tracker, lost when its peak-to-sidelobe
+      ratio falls below ``min_confidence``
+    - ``roi``: the detector itself, run only on a region ``roi_margin`` box sizes
+      around the last face, lost when that region no longer holds exactly one face
+
+    ``detect(image, frame_width)`` runs the full detector; for ROI crops it is
+    given the full frame width so the crop is searched at the frame's scale.
+
+    Frames with no face or several faces always get a full detection, so a
+    second person entering the frame is reported at the latest on the next
+    scheduled re-detection.
+    """
+
+    def __init__(self, detect, mode='correlation', redetect_interval=10, min_confidence=7.0, roi_margin=0.5):
+        if mode == 'correlation' and dlib is None:
+            mode = 'roi'
+        self.detect = detect
+        self.mode = mode
+        self.redetect_interval = redetect_interval
+        self.min_confidence = min_confidence
+        self.roi_margin = roi_margin
+
+        self.face = None
+        self.tracker = None
+        self.frames_since_detection = 0
+
+    def update(self, gray):
+        """Return (faces, tracked) for the next grayscale frame"""
+        if self.face is not None and self.frames_since_detection < self.redetect_interval:
+            face = self._track(gray)
+            if face is not None:
+                self.face = face
+                self.frames_since_detection += 1
+                return [face], True
+
+        faces = self.detect(gray)
+        self._restart(gray, faces)
+        return faces, False
+
+    def _restart(self, gray, faces):
+        self.frames_since_detection = 0
+        self.tracker = None
+        self.face = None
+        if not faces or len(faces) != 1:
+            return
+
+        face = faces[0]
+        if self.mode == 'correlation':
+            try:
+                tracker = dlib.correlation_tracker()
+                tracker.start_track(gray, dlib.rectangle(face['x'], face['y'],
+                                                         face['x'] + face['width'], face['y'] + face['height']))
+            except Exception:
+                # No tracker: stay on full detection rather than track with nothing
+                return
+            self.tracker = tracker
+        # Only now is the session in tracking state
+        self.face = face
+
+    def _track(self, gray):
+        if self.mode == 'correlation':
+            return self._track_correlation(gray)
+        return self._track_roi(gray)
+
+    def _track_correlation(self, gray):
+        confidence = self.tracker.update(gray)
+        if confidence < self.min_confidence:
+            return None
+
+        position = self.tracker.get_position()
+        h, w = gray.shape[:2]
+        x1, y1 = max(0, int(position.left())), max(0, int(position.top()))
+        x2, y2 = min(w, int(position.right())), min(h, int(position.bottom()))
+        if x2 <= x1 or y2 <= y1:
+            return None
+
+        return {
+            'x': x1,
+            'y': y1,
+            'width': x2 - x1,
+            'height': y2 - y1,
+            'confidence': self.face['confidence']
+        }
+
+    def _track_roi(self, gray):
+        face = self.face
+        h, w = gray.shape[:2]
+        margin_x = int(face['width'] * self.roi_margin)
+        margin_y = int(face['height'] * self.roi_margin)
+        x0, y0 = max(0, face['x'] - margin_x), max(0, face['y'] - margin_y)
+        x1 = min(w, face['x'] + face['width'] + margin_x)
+        y1 = min(h, face['y'] + face['height'] + margin_y)
+
+        # dlib needs a contiguous image; the crop is small, so the copy is cheap
+        faces = self.detect(np.ascontiguousarray(gray[y0:y1, x0:x1]), w)
+        if not faces or len(faces) != 1:
+            return None
+
+        found = faces[0]
+        found['x'] += x0
+        found['y'] += y0
+        return found
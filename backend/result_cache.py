@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class ResultCache:
+    """Per-session cache of the last detection result, reused while the frame barely changes.
+
+    Each session keeps one entry: a tiny grayscale thumbnail of the last frame
+    that went through detection and that frame's result. A new frame whose
+    thumbnail differs from it by less than ``max_diff`` (mean absolute
+    difference in gray levels) and in no cell by ``max_cell_diff`` or more
+    gets the stored result back, marked ``cached``. The per-cell check
+    catches local changes, such as a second face or a phone entering a few
+    cells, that barely move the mean.
+    Comparing against the last *detected* frame rather than the last frame
+    seen means slow drift still adds up to a re-detection.
+
+    Memory is bounded: entries are fixed-size, at most ``max_sessions`` are
+    kept (least recently used evicted first) and entries older than
+    ``ttl_seconds`` are re-detected and swept. ``max_diff=0`` disables it.
+    Safe to share between threads (the async server's inline thread pool).
+    """
+
+    def __init__(self, max_diff=2.0, ttl_seconds=5.0, max_sessions=1024, thumb_size=(16, 12), max_cell_diff=20.0):
+        self.max_diff = max_diff
+        self.max_cell_diff = max_cell_diff
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.thumb_size = thumb_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    def thumbnail(self, gray):
+        return cv2.resize(gray, self.thumb_size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def lookup(self, sid, gray):
+        """Return (cached_result or None, thumbnail); pass the thumbnail to ``store`` on a miss"""
+        if sid is None or self.max_diff <= 0:
+            return None, None
+
+        thumb = self.thumbnail(gray)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None and now - entry[2] < self.ttl_seconds:
+                diff = np.abs(thumb - entry[0])
+                if diff.mean() < self.max_diff and diff.max() < self.max_cell_diff:
+                    self._entries.move_to_end(sid)
+                    self.hits += 1
+                    return dict(entry[1], cached=True, timestamp=time.time()), thumb
+
+            self.misses += 1
+        return None, thumb
+
+    def store(self, sid, thumb, result):
+        """Remember the result of a frame that went through detection"""
+        if thumb is None:
+            return
+
+        now = time.monotonic()
+        entry = (thumb, {key: value for key, value in result.items() if key != '_metrics'}, now)
+        with self._lock:
+            self._entries[sid] = entry
+            self._entries.move_to_end(sid)
+
+            if now - self._last_sweep >= self.ttl_seconds:
+                self._last_sweep = now
+                for key in [key for key, entry in self._entries.items() if now - entry[2] >= self.ttl_seconds]:
+                    del self._entries[key]
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def forget(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        return len(self._entries)
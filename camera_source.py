@@ -0,0 +1,162 @@
+"""
+Background camera capture shared by the games and the pose monitors
+CameraSource reads a cv2.VideoCapture on its own thread into a small ring of
+preallocated frames and hands out the newest one, so a slow game loop or
+model never works on stale, buffered frames and camera I/O never blocks it.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class FrameRing:
+    """Preallocated frame slots shared by a writer and its readers.
+
+    The capture thread writes into a slot nobody holds and publishes it as the
+    latest; readers pin the slot they work on until they release it. Only slot
+    indices change hands, so frames are never copied or reallocated.
+    """
+
+    def __init__(self, slots, shape, dtype=np.uint8):
+        self.frames = np.empty((slots,) + tuple(shape), dtype=dtype)
+        self.captured_at = np.zeros(slots)
+        self.sequence = np.full(slots, -1, dtype=np.int64)
+        self._pinned = np.zeros(slots, dtype=bool)
+        self._latest = -1
+        self._next_sequence = 0
+        self._cursor = 0
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def writable_slot(self):
+        """A slot that is neither pinned nor the latest frame"""
+        with self._cond:
+            for _ in range(len(self.frames)):
+                self._cursor = (self._cursor + 1) % len(self.frames)
+                if not self._pinned[self._cursor] and self._cursor != self._latest:
+                    return self._cursor
+        raise RuntimeError('Every frame slot is pinned; use more slots')
+
+    def publish(self, slot, captured_at):
+        with self._cond:
+            self.captured_at[slot] = captured_at
+            self.sequence[slot] = self._next_sequence
+            self._next_sequence += 1
+            self._latest = slot
+            self._cond.notify_all()
+
+    def acquire_latest(self, after_sequence, timeout=None):
+        """Pin and return the newest slot captured after ``after_sequence``, or None once closed"""
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self.closed or (self._latest >= 0 and self.sequence[self._latest] > after_sequence),
+                timeout)
+            if self.closed or not ready:
+                return None
+            self._pinned[self._latest] = True
+            return self._latest
+
+    def release(self, slot):
+        with self._cond:
+            self._pinned[slot] = False
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class CameraSource:
+    """A camera read on a background thread, newest frame first.
+
+    ``read()`` works like ``cv2.VideoCapture.read``: it returns (ok, frame)
+    for the newest frame captured since the previous call, waiting for one
+    if needed (or, with ``wait=False``, the newest frame even if it was
+    returned before). Frames that arrived in between are dropped and counted
+    in ``dropped``. The frame is a slot of the ring, valid until the next
+    ``read``; ``timestamp`` is the time.monotonic() at which the camera
+    returned it.
+
+    Pass an open ``cap`` to wrap an existing capture; ``stats`` (anything
+    with ``tick(latency)``) is ticked with the read time of every frame.
+    """
+
+    def __init__(self, index=0, width=None, height=None, slots=4, cap=None, stats=None):
+        self.cap = cap if cap is not None else cv2.VideoCapture(index)
+        if width:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.slots = slots
+        self.stats = stats
+        self.ring = None
+        self.timestamp = None
+        self.dropped = 0
+        self._slot = None
+        self._sequence = -1
+        self._thread = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        """Size the ring from a first frame and start capturing; False if the camera gives no frame"""
+        if self._thread is None:
+            ret, frame = self.cap.read()
+            if not ret:
+                return False
+            self.ring = FrameRing(self.slots, frame.shape, frame.dtype)
+            self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+            self._thread.start()
+        return True
+
+    def _capture_loop(self):
+        ring = self.ring
+        while not ring.closed:
+            slot = ring.writable_slot()
+            # Index once: every ring.frames[slot] is a new view object
+            buf = ring.frames[slot]
+            started = time.monotonic()
+            ret, frame = self.cap.read(buf)
+            captured_at = time.monotonic()
+            if not ret:
+                break
+            if frame is not buf:
+                # The camera changed size or type; fit it into the slot
+                cv2.resize(frame, buf.shape[1::-1], dst=buf)
+            if self.stats is not None:
+                self.stats.tick(captured_at - started)
+            ring.publish(slot, captured_at)
+        ring.close()
+
+    def read(self, wait=True, timeout=None):
+        """(ok, frame) for the newest frame; ok is False once the camera stops"""
+        if not self.start():
+            return False, None
+        if self._slot is not None:
+            self.ring.release(self._slot)
+            self._slot = None
+
+        slot = self.ring.acquire_latest(self._sequence if wait else -1, timeout)
+        if slot is None:
+            return False, None
+        sequence = self.ring.sequence[slot]
+        if sequence > self._sequence:
+            self.dropped += sequence - self._sequence - 1
+        self._slot, self._sequence = slot, sequence
+        self.timestamp = float(self.ring.captured_at[slot])
+        return True, self.ring.frames[slot]
+
+    def stop(self):
+        """Stop capturing; the VideoCapture stays open"""
+        if self.ring is not None:
+            self.ring.close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def release(self):
+        self.stop()
+        self.cap.release()
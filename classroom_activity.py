@@ -0,0 +1,35 @@
+"""
+Classroom activity rules shared by the head pose scripts
+determine_activity turns a (smoothed) pitch and yaw into the activity label
+that the classroom monitor logs, the batch analyser writes and the smoothing
+and accuracy replays score against.
+"""
+
+# Yaw beyond +-this many degrees counts as looking sideways
+SIDEWAYS_YAW = 25
+# Pitch above this (head down) counts as writing
+WRITING_PITCH = 20
+# Pitch below this (head up) counts as looking up, away from the board
+LOOKING_UP_PITCH = -15
+
+
+# Function to determine student activity based on head pose
+def determine_activity(pitch, yaw, previous=None, band=0.0):
+    # Hysteresis: the previous activity is only left once the angles are ``band`` degrees back past its threshold
+    yaw_limit, down, up = SIDEWAYS_YAW, WRITING_PITCH, LOOKING_UP_PITCH
+    if previous == "Distracted - Looking Sideways":
+        yaw_limit -= band
+    elif previous == "Writing":
+        down -= band
+    elif previous == "Distracted - Looking Up":
+        up += band
+
+    if yaw < -yaw_limit or yaw > yaw_limit:  # Looking significantly sideways
+        return "Distracted - Looking Sideways"
+    elif pitch > down:  # Looking down significantly (possibly writing)
+        return "Writing"
+    elif pitch < up:  # Looking up (not at board)
+        return "Distracted - Looking Up"
+    elif up <= pitch <= down and -yaw_limit <= yaw <= yaw_limit:  # Normal viewing range
+        return "Viewing Board"
+    return "Unknown"
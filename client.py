@@ -1,6 +1,7 @@
 import socket
 import json
 import cv2
+from camera_source import CameraSource
 from handDetector import HandDetector
 
 PORT = 5000
@@ -12,8 +13,8 @@ def join_game():
     client.connect((server_ip, PORT))
     print("[CLIENT] Connected to host 🎮")
 
-    cap = cv2.VideoCapture(0)
-    detector = HandDetector(detectionCon=0.8, maxHands=1)
+    cap = CameraSource(0)
+    detector = HandDetector(HandNo=1, detectionConfidence=0.8)
     game_state = {}
 
     while True:
@@ -23,9 +24,11 @@ def join_game():
         frame = cv2.flip(frame, 1)
 
         # Detect client paddle (right side)
-        hands, _ = detector.findHands(frame, flipType=False, draw=False)
-        if hands:
-            y = hands[0]["center"][1]
+        detector.process(frame, draw=False, timestamp=cap.timestamp)
+        boxes = detector.boundingboxes()
+        if len(boxes):
+            # Centre of the hand's bounding box
+            y = int(boxes[0, 1] + boxes[0, 3]) // 2
             msg = json.dumps({"paddle_right": y})
             client.sendall(msg.encode("utf-8"))
 
@@ -1,9 +1,42 @@
 import cv2
 import numpy as np
 import mediapipe as mp
+from itertools import chain
+from operator import attrgetter
+
+from camera_source import CameraSource
+
+# Landmarks per hand in MediaPipe Hands
+NUM_LANDMARKS = 21
+# Handedness codes used by HandDetector.handedness()
+HANDEDNESS = ('Left', 'Right')
+_xyz = attrgetter('x', 'y', 'z')
 
 class HandDetector:
-    def __init__(self, mode=False, HandNo=2, detectionConfidence=0.5, trackingConfidence=0.5):
+    """MediaPipe Hands with the landmarks kept in NumPy arrays.
+
+    ``process`` fills preallocated buffers in one pass per frame:
+    ``landmarks()`` is every hand's (x, y, z) in pixels as a (hands, 21, 3)
+    float32 array, ``pixels()`` the same points as int32 (x, y),
+    ``boundingboxes()`` each hand's x1, y1, x2, y2 and ``handedness()`` 0 for
+    a left hand and 1 for a right one. The returned arrays are views that the
+    next ``process`` overwrites. ``fingerdetector`` still returns the old
+    [id, x, y] list. Pass the frame's capture ``timestamp`` (e.g. from
+    camera_source.CameraSource) to keep it with the landmarks as
+    ``self.timestamp``, and pass ``rgb``, the frame already converted to
+    RGB, to skip the detector's own conversion when the caller needs one too.
+
+    With ``roi=True``, once hands are found the next frame is only searched
+    in a crop around their bounding boxes, grown by ``roiMargin`` of the
+    box size on every side and downscaled to at most ``roiSize`` pixels;
+    the landmarks are mapped back to the full frame. When no hand is found
+    in the crop the same frame is searched in full. New hands outside the
+    crop are only picked up once the tracked ones are lost, so this suits
+    one-hand games best.
+    """
+
+    def __init__(self, mode=False, HandNo=2, detectionConfidence=0.5, trackingConfidence=0.5,
+                 roi=False, roiMargin=0.5, roiSize=256):
         self.static_image_mode = mode
         self.max_num_hands = HandNo
         self.model_complexity = 1
@@ -12,24 +45,120 @@ class HandDetector:
         self.mpHands = mp.solutions.hands
         self.hands = self.mpHands.Hands(self.static_image_mode,self.max_num_hands,self.model_complexity,self.min_detection_confidence,self.min_tracking_confidence)
         self.mpDraw = mp.solutions.drawing_utils
+        self.results = None
+        self.timestamp = None
+        self.count = 0
+        self._derived = False
+        self._landmarks = np.zeros((HandNo, NUM_LANDMARKS, 3), dtype=np.float32)
+        self._pixels = np.zeros((HandNo, NUM_LANDMARKS, 2), dtype=np.int32)
+        self._boxes = np.zeros((HandNo, 4), dtype=np.int32)
+        self._handedness = np.zeros(HandNo, dtype=np.int8)
+        self._scale = np.ones(3, dtype=np.float32)
+        self._offset = np.zeros(3, dtype=np.float32)
+        self.roi = roi
+        self.roiMargin = roiMargin
+        self.roiSize = roiSize
+        # x1, y1, x2, y2 of the crop searched next, None for the full frame
+        self.crop = None
 
-    def process(self, img,draw=True):
-        imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    def process(self, img,draw=True,timestamp=None,rgb=None):
+        self.timestamp = timestamp
+        if self.crop is not None:
+            x1, y1, x2, y2 = self.crop
+            if self._search(img[y1:y2, x1:x2], None if rgb is None else rgb[y1:y2, x1:x2], draw, (x1, y1)):
+                self._track(img.shape)
+                return img
+        self._search(img, rgb, draw)
+        self._track(img.shape)
+        return img
+
+    def _search(self, img, rgb, draw, offset=None):
+        """Run the model on img (a frame or a crop of it at offset); True if a hand was found"""
+        small = img if rgb is None else rgb
+        h, w = img.shape[:2]
+        if offset is not None and max(h, w) > self.roiSize:
+            # The landmarks are normalised, so the downscaled crop needs no extra mapping
+            scale = self.roiSize / max(h, w)
+            small = cv2.resize(small, (max(1, round(w * scale)), max(1, round(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+        imgRGB = small if rgb is not None else cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
         self.results = self.hands.process(imgRGB)
-        if self.results.multi_hand_landmarks:
+        self._fill(img.shape, offset)
+        if draw and self.results.multi_hand_landmarks:
             for handlandmarks in self.results.multi_hand_landmarks:
-                if draw:
-                    self.mpDraw.draw_landmarks(img, handlandmarks, self.mpHands.HAND_CONNECTIONS)
-        return img
+                self.mpDraw.draw_landmarks(img, handlandmarks, self.mpHands.HAND_CONNECTIONS)
+        return self.count > 0
+
+    def _track(self, shape):
+        """Pick the crop for the next frame from this frame's hands"""
+        if not self.roi or self.count == 0:
+            self.crop = None
+            return
+        boxes = self.boundingboxes()
+        x1, y1 = boxes[:, :2].min(axis=0).tolist()
+        x2, y2 = boxes[:, 2:].max(axis=0).tolist()
+        # A square crop keeps the hand's proportions for the model
+        side = max(x2 - x1, y2 - y1, 32) * (1 + 2 * self.roiMargin)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        h, w = shape[:2]
+        self.crop = (max(0, int(cx - side / 2)), max(0, int(cy - side / 2)),
+                     min(w, int(cx + side / 2)), min(h, int(cy + side / 2)))
+
+    def _fill(self, shape, offset=None):
+        """Copy this frame's landmarks and handedness into the buffers, in pixels of the full frame"""
+        hands = self.results.multi_hand_landmarks or []
+        self.count = count = min(len(hands), self.max_num_hands)
+        self._derived = False
+        if count == 0:
+            return
+
+        h, w = shape[:2]
+        # MediaPipe's z is on the same scale as x
+        self._scale[:] = (w, h, w)
+        landmarks = chain.from_iterable(hand.landmark for hand in hands[:count])
+        values = np.fromiter(chain.from_iterable(map(_xyz, landmarks)), dtype=np.float32,
+                             count=count * NUM_LANDMARKS * 3)
+        landmarks = self._landmarks[:count]
+        np.multiply(values.reshape(count, NUM_LANDMARKS, 3), self._scale, out=landmarks)
+        if offset is not None:
+            self._offset[:2] = offset
+            landmarks += self._offset
+
+        for index, handedness in enumerate((self.results.multi_handedness or [])[:count]):
+            self._handedness[index] = handedness.classification[0].label == HANDEDNESS[1]
+
+    def _derive(self):
+        """Integer pixels and boxes, computed on first use each frame"""
+        if not self._derived:
+            pixels = self._pixels[:self.count]
+            # Truncate like int(lm.x * w) did
+            np.copyto(pixels, self._landmarks[:self.count, :, :2], casting='unsafe')
+            pixels.min(axis=1, out=self._boxes[:self.count, :2])
+            pixels.max(axis=1, out=self._boxes[:self.count, 2:])
+            self._derived = True
+
+    def landmarks(self):
+        """(hands, 21, 3) float32 pixel x, y and z of every detected hand"""
+        return self._landmarks[:self.count]
+
+    def pixels(self):
+        """(hands, 21, 2) int32 pixel x, y of every detected hand"""
+        self._derive()
+        return self._pixels[:self.count]
+
+    def boundingboxes(self):
+        """(hands, 4) int32 x1, y1, x2, y2 around every detected hand"""
+        self._derive()
+        return self._boxes[:self.count]
+
+    def handedness(self):
+        """(hands,) int8: 0 for a left hand, 1 for a right hand (see HANDEDNESS)"""
+        return self._handedness[:self.count]
 
     def fingerdetector(self,img,handNo=0):
         self.lmList = []
-        if self.results.multi_hand_landmarks:
-            handlandmarks = self.results.multi_hand_landmarks[handNo]
-            for id, lm in enumerate(handlandmarks.landmark):
-                h, w, c = img.shape
-                cx, cy = int(lm.x*w), int(lm.y*h)
-                self.lmList.append([id, cx, cy])
+        if handNo < self.count:
+            self.lmList = [[id, cx, cy] for id, (cx, cy) in enumerate(self.pixels()[handNo].tolist())]
         return self.lmList
 
     def boundingbox(self,img,lmList,draw=True):
@@ -43,11 +172,13 @@ class HandDetector:
         return img, (maxX, maxY, minX, minY)
 
 def main():
-    cap = cv2.VideoCapture(0)
+    cap = CameraSource(0)
     detector = HandDetector()
     while True:
         success, img = cap.read()
-        img = detector.process(img,draw=True)
+        if not success:
+            break
+        img = detector.process(img,draw=True,timestamp=cap.timestamp)
         lmList = detector.fingerdetector(img)
         print(lmList)
         cv2.imshow("Image", img)
@@ -55,4 +186,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
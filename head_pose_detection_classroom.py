@@ -1,212 +1,299 @@
-import cv2
-import numpy as np
-import mediapipe as mp
-import csv
-import datetime
-from collections import deque
-import time
-
-# Initialize mediapipe face mesh
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1, refine_landmarks=True)
-
-# Define 3D model points of key landmarks
-model_points = np.array([
-    (0.0, 0.0, 0.0),             # Nose tip
-    (0.0, -330.0, -65.0),        # Chin
-    (-225.0, 170.0, -135.0),     # Left eye left corner
-    (225.0, 170.0, -135.0),      # Right eye right corner
-    (-150.0, -150.0, -125.0),    # Left mouth corner
-    (150.0, -150.0, -125.0)      # Right mouth corner
-])
-
-# Corresponding indices in MediaPipe's 468-point face mesh
-LANDMARK_IDS = {
-    "nose_tip": 1,
-    "chin": 152,
-    "left_eye_left_corner": 263,
-    "right_eye_right_corner": 33,
-    "left_mouth_corner": 287,
-    "right_mouth_corner": 57
-}
-
-# Initialize variables for temporal smoothing
-pitch_vals = deque(maxlen=5)
-yaw_vals = deque(maxlen=5)
-roll_vals = deque(maxlen=5)
-
-# Initialize variables for activity tracking
-activity_timer = 0
-activity_state = "Viewing Board"
-prev_activity_state = "Viewing Board"
-writing_timer = 0
-distraction_timer = 0
-
-# Try different camera indices
-def try_camera_indices():
-    for index in range(4):  # Try first four camera indices
-        print(f"Attempting to open camera at index {index}...")
-        cap = cv2.VideoCapture(index)
-        if cap.isOpened():
-            ret, test_frame = cap.read()
-            if ret:
-                print(f"Successfully opened camera at index {index}")
-                return cap
-            else:
-                print(f"Camera at index {index} opened but failed to read frame")
-            cap.release()
-        else:
-            print(f"Failed to open camera at index {index}")
-    print("No working camera found after trying all indices")
-    return None
-
-# Start webcam
-cap = try_camera_indices()
-
-# Check if camera opened successfully
-if cap is None:
-    print("Error: Could not open camera.")
-    exit()
-
-# Try to get a frame to ensure camera is working
-ret, test_frame = cap.read()
-if not ret:
-    print("Error: Could not read frame from camera.")
-    cap.release()
-    exit()
-
-print("Camera initialized successfully. Press 'q' or 'ESC' to exit.")
-
-# Set camera properties for better performance
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-# Initialize variables for FPS calculation
-prev_frame_time = 0
-
-# Function to determine student activity based on head pose
-def determine_activity(pitch, yaw):
-    if yaw < -25 or yaw > 25:  # Looking significantly sideways
-        return "Distracted - Looking Sideways"
-    elif pitch > 20:  # Looking down significantly (possibly writing)
-        return "Writing"
-    elif pitch < -15:  # Looking up (not at board)
-        return "Distracted - Looking Up"
-    elif -15 <= pitch <= 20 and -25 <= yaw <= 25:  # Normal viewing range
-        return "Viewing Board"
-    return "Unknown"
-
-# Function to log activity with timestamp
-def log_activity(activity):
-    with open('classroom_activity_log.csv', mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([datetime.datetime.now(), activity])
-
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    h, w = frame.shape[:2]
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = face_mesh.process(rgb)
-
-    if results.multi_face_landmarks:
-        face_landmarks = results.multi_face_landmarks[0].landmark
-
-        # Get 2D image points
-        image_points = np.array([
-            (face_landmarks[LANDMARK_IDS["nose_tip"]].x * w, face_landmarks[LANDMARK_IDS["nose_tip"]].y * h),
-            (face_landmarks[LANDMARK_IDS["chin"]].x * w, face_landmarks[LANDMARK_IDS["chin"]].y * h),
-            (face_landmarks[LANDMARK_IDS["left_eye_left_corner"]].x * w, face_landmarks[LANDMARK_IDS["left_eye_left_corner"]].y * h),
-            (face_landmarks[LANDMARK_IDS["right_eye_right_corner"]].x * w, face_landmarks[LANDMARK_IDS["right_eye_right_corner"]].y * h),
-            (face_landmarks[LANDMARK_IDS["left_mouth_corner"]].x * w, face_landmarks[LANDMARK_IDS["left_mouth_corner"]].y * h),
-            (face_landmarks[LANDMARK_IDS["right_mouth_corner"]].x * w, face_landmarks[LANDMARK_IDS["right_mouth_corner"]].y * h)
-        ], dtype="double")
-
-        # Camera internals
-        focal_length = w
-        center = (w / 2, h / 2)
-        camera_matrix = np.array([
-            [focal_length, 0, center[0]],
-            [0, focal_length, center[1]],
-            [0, 0, 1]
-        ], dtype="double")
-
-        dist_coeffs = np.zeros((4, 1))
-
-        # Solve PnP
-        success, rotation_vector, translation_vector = cv2.solvePnP(
-            model_points, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE)
-
-        # Convert rotation vector to rotation matrix and euler angles
-        rotation_matrix, _ = cv2.Rodrigues(rotation_vector)
-        euler_angles = cv2.RQDecomp3x3(rotation_matrix)[0]
-        
-        # Apply temporal smoothing
-        pitch_vals.append(euler_angles[0])
-        yaw_vals.append(euler_angles[1])
-        roll_vals.append(euler_angles[2])
-        
-        pitch = sum(pitch_vals) / len(pitch_vals)
-        yaw = sum(yaw_vals) / len(yaw_vals)
-        roll = sum(roll_vals) / len(roll_vals)
-
-        # Determine current activity
-        current_activity = determine_activity(pitch, yaw)
-        
-        # Update activity state and timers
-        if current_activity == prev_activity_state:
-            activity_timer += 1
-        else:
-            if activity_timer > 10:  # Log only if activity lasted for more than 10 frames
-                log_activity(prev_activity_state)
-            activity_timer = 0
-            prev_activity_state = current_activity
-
-        # Update writing and distraction timers
-        if current_activity == "Writing":
-            writing_timer += 1
-        else:
-            writing_timer = 0
-
-        # Update distraction timer for both sideways and up distraction
-        if current_activity in ["Distracted - Looking Sideways", "Distracted - Looking Up"]:
-            distraction_timer += 1
-        else:
-            distraction_timer = 0
-
-        # Display activity status
-        cv2.putText(frame, f"Activity: {current_activity}", (10, 30), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-        # Display writing duration
-        if writing_timer > 0:
-            writing_duration = writing_timer / 30  # Assuming 30 fps
-            cv2.putText(frame, f"Writing Duration: {writing_duration:.1f}s", 
-                        (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-
-        # Display distraction warning
-        if distraction_timer > 30:  # Warning after 1 second of distraction
-            cv2.putText(frame, "Distraction Warning!", (10, 90), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-        # Display angles for debugging
-        angle_text = f"Pitch: {pitch:.1f}, Yaw: {yaw:.1f}, Roll: {roll:.1f}"
-        cv2.putText(frame, angle_text, (10, 120), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-
-        # Calculate and display FPS
-        current_time = time.time()
-        fps = 1 / (current_time - prev_frame_time)
-        prev_frame_time = current_time
-        cv2.putText(frame, f"FPS: {fps:.1f}", (10, 150), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-
-    cv2.imshow('Classroom Head Pose Monitor', frame)
-    key = cv2.waitKey(1) & 0xFF
-    if key == ord('q') or key == 27:  # Press 'q' or ESC to exit
-        break
-
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+import argparse
+import cv2
+import time
+
+import numpy as np
+
+from activity_logger import ActivityLogger
+from classroom_activity import determine_activity
+from head_pose_estimator import POSE_MODES, HeadPoseEstimator, open_camera
+from pose_pipeline import PosePipeline
+from pose_scheduler import InferenceScheduler
+from pose_smoothing import SMOOTHERS, make_smoother
+from pose_telemetry import TelemetryWriter
+from student_tracks import StudentTracks, boxes_from_points
+
+WINDOW_NAME = 'Classroom Head Pose Monitor'
+
+# Activities shorter than this are not logged (the old 10 frames at 30 fps)
+MIN_ACTIVITY_SECONDS = 0.33
+# Distraction lasting longer than this raises a warning
+DISTRACTION_WARNING_SECONDS = 1.0
+
+def update_timers(state, current_activity, timestamp, logger, key=None):
+    """Advance one student's activity timers; ``state`` is a Track or SingleStudentMonitor"""
+    # Update activity state and timers
+    if logger.run_length:
+        # The logger merges consecutive frames into one row per activity
+        logger.log(current_activity, key=key)
+    elif current_activity != state.activity:
+        # Log only activities that lasted long enough to be more than jitter
+        if state.activity is not None and timestamp - state.activity_since > MIN_ACTIVITY_SECONDS:
+            logger.log(state.activity, key=key)
+        state.activity = current_activity
+        state.activity_since = timestamp
+
+    # Update writing and distraction timers
+    if current_activity != "Writing":
+        state.writing_since = None
+    elif state.writing_since is None:
+        state.writing_since = timestamp
+
+    # Update distraction timer for both sideways and up distraction
+    if current_activity not in ["Distracted - Looking Sideways", "Distracted - Looking Up"]:
+        state.distracted_since = None
+    elif state.distracted_since is None:
+        state.distracted_since = timestamp
+
+    writing_seconds = None if state.writing_since is None else timestamp - state.writing_since
+    warning = state.distracted_since is not None and \
+        timestamp - state.distracted_since > DISTRACTION_WARNING_SECONDS
+    return writing_seconds, warning
+
+class SingleStudentMonitor:
+    """One student: the first face in the frame.
+
+    ``infer`` runs the pose and activity logic on a frame and returns what
+    ``draw`` needs to render it, so the two can run on different threads.
+    Timers run on the frame timestamps (time.monotonic() by default). With a
+    ``scheduler`` FaceMesh only runs on the frames it picks; the others use
+    its predicted angles. Angles go through ``smoother`` (see
+    pose_smoothing) and activities change with a hysteresis of ``band``
+    degrees.
+    """
+
+    def __init__(self, estimator, logger, telemetry, scheduler=None, smoother=None, band=0.0):
+        self.estimator = estimator
+        self.logger = logger
+        self.telemetry = telemetry
+        self.scheduler = scheduler
+        self.smoother = smoother or make_smoother()
+        self.band = band
+
+        # Initialize variables for activity tracking
+        self.current_activity = None
+        self.activity = "Viewing Board"
+        self.activity_since = None
+        self.writing_since = None
+        self.distracted_since = None
+
+    def infer(self, frame, timestamp=None):
+        """Returns (activity, pitch, yaw, roll, writing_seconds, distraction_warning), or None without a face"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.activity_since is None:
+            self.activity_since = timestamp
+
+        pose = None
+        if self.scheduler is None or self.scheduler.should_run():
+            started = time.perf_counter()
+            pose = self.estimator.process(frame)
+            if self.scheduler is not None:
+                angles = None if pose is None else (pose.pitch, pose.yaw, pose.roll)
+                self.scheduler.observe(timestamp, angles, time.perf_counter() - started)
+            if pose is None:
+                if self.telemetry is not None:
+                    self.telemetry.write(None, 'No Face')
+                return None
+            angles = (pose.pitch, pose.yaw, pose.roll)
+        else:
+            angles = self.scheduler.predict(timestamp)
+            if angles is None:
+                return None
+
+        # Apply temporal smoothing
+        pitch, yaw, roll = self.smoother.update(angles, timestamp)
+
+        # Determine current activity
+        current_activity = self.current_activity = determine_activity(pitch, yaw, self.current_activity, self.band)
+        if pose is not None and self.telemetry is not None:
+            self.telemetry.write(pose, current_activity)
+
+        writing_seconds, warning = update_timers(self, current_activity, timestamp, self.logger)
+        return current_activity, pitch, yaw, roll, writing_seconds, warning
+
+    def draw(self, frame, status, fps=None):
+        if status is None:
+            return
+        current_activity, pitch, yaw, roll, writing_seconds, warning = status
+
+        # Display activity status
+        cv2.putText(frame, f"Activity: {current_activity}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # Display writing duration
+        if writing_seconds is not None:
+            cv2.putText(frame, f"Writing Duration: {writing_seconds:.1f}s",
+                        (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+
+        # Display distraction warning
+        if warning:
+            cv2.putText(frame, "Distraction Warning!", (10, 90),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+        # Display angles for debugging
+        angle_text = f"Pitch: {pitch:.1f}, Yaw: {yaw:.1f}, Roll: {roll:.1f}"
+        cv2.putText(frame, angle_text, (10, 120),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+
+        if fps is not None:
+            text = f"FPS: {fps:.1f}"
+            if self.scheduler is not None:
+                text += f"  {self.scheduler.describe()}"
+            cv2.putText(frame, text, (10, 150),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+
+class MultiStudentMonitor:
+    """Every face in the frame, each followed as a student with a stable id.
+
+    With a ``scheduler``, skipped frames hold every visible student's last
+    smoothed angles; their timers keep running on the frame timestamps.
+    Each student gets their own ``smoothing`` filter and hysteresis state.
+    """
+
+    def __init__(self, estimator, logger, telemetry, scheduler=None, smoothing='mean', band=0.0):
+        self.estimator = estimator
+        self.logger = logger
+        self.telemetry = telemetry
+        self.scheduler = scheduler
+        self.band = band
+        self.tracks = StudentTracks(make_smoother=lambda: make_smoother(smoothing))
+        self.faces = 0
+        self._held = []
+
+    def infer(self, frame, timestamp=None):
+        """Returns (faces, [(id, box, activity, writing_seconds, distraction_warning), ...])"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        if self.scheduler is not None and not self.scheduler.should_run():
+            return self.faces, [self._label(track, pitch, yaw, timestamp) for track, pitch, yaw in self._held]
+
+        started = time.perf_counter()
+        h, w = frame.shape[:2]
+        points = self.estimator.process_faces(frame)
+        students, ended = self.tracks.update(boxes_from_points(points))
+        for track in ended:
+            self.estimator.forget(track.id)
+
+        self.faces = len(points)
+        self._held = []
+        for track, face_points in zip(students, points):
+            pose = self.estimator.solve(face_points, w, h, key=track.id)
+            if pose is None:
+                continue
+
+            pitch, yaw, roll = track.smooth(pose.pitch, pose.yaw, pose.roll, timestamp)
+            if self.telemetry is not None:
+                activity = determine_activity(pitch, yaw, track.current_activity, self.band)
+                self.telemetry.write(pose, activity, track=track.id)
+            self._held.append((track, pitch, yaw))
+
+        if self.scheduler is not None:
+            # Compare students in id order, so a change in face order is not mistaken for motion
+            held = sorted(self._held, key=lambda entry: entry[0].id)
+            angles = np.array([(pitch, yaw) for _, pitch, yaw in held]).reshape(-1, 2) if held else None
+            self.scheduler.observe(timestamp, angles, time.perf_counter() - started)
+
+        return self.faces, [self._label(track, pitch, yaw, timestamp) for track, pitch, yaw in self._held]
+
+    def _label(self, track, pitch, yaw, timestamp):
+        current_activity = track.current_activity = determine_activity(pitch, yaw, track.current_activity, self.band)
+        writing_seconds, warning = update_timers(track, current_activity, timestamp, self.logger, key=track.id)
+        return track.id, track.box.astype(int), current_activity, writing_seconds, warning
+
+    def draw(self, frame, status, fps=None):
+        faces, labels = status
+        for track_id, (x1, y1, x2, y2), current_activity, writing_seconds, warning in labels:
+            # Label each student above their face
+            color = (0, 0, 255) if warning else (0, 255, 0)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            label = f"#{track_id} {current_activity}"
+            if writing_seconds is not None:
+                label += f" ({writing_seconds:.1f}s)"
+            cv2.putText(frame, label, (x1, max(15, y1 - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+        header = f"Students: {faces}" if fps is None else f"FPS: {fps:.1f}  Students: {faces}"
+        if self.scheduler is not None:
+            header += f"  {self.scheduler.describe()}"
+        cv2.putText(frame, header, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+
+def run_serial(cap, monitor):
+    """Read, infer, draw and show each frame in turn"""
+    # Initialize variables for FPS calculation
+    prev_frame_time = 0
+
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        status = monitor.infer(frame)
+
+        # Calculate and display FPS
+        current_time = time.time()
+        fps = 1 / (current_time - prev_frame_time)
+        prev_frame_time = current_time
+        monitor.draw(frame, status, fps)
+
+        cv2.imshow(WINDOW_NAME, frame)
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q') or key == 27:  # Press 'q' or ESC to exit
+            break
+
+def main():
+    parser = argparse.ArgumentParser(description='Classroom head pose monitor')
+    parser.add_argument('--run-length', action='store_true',
+                        help='Log one start,end,duration,activity row per activity instead of per change')
+    parser.add_argument('--telemetry', help='Also record every frame\'s pose to this binary telemetry file')
+    parser.add_argument('--students', type=int, default=1,
+                        help='Faces to follow; above 1, each student gets an id and its own log rows')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Capture, infer and render on separate threads, showing per-stage throughput and latency')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Run FaceMesh only every k-th frame while the pose is stable or the CPU falls behind')
+    parser.add_argument('--max-stride', type=int, default=4, help='Largest k used by --adaptive')
+    parser.add_argument('--pose-mode', choices=list(POSE_MODES), default='accurate',
+                        help='fast: FaceMesh without iris refinement; detector: face detector keypoints only')
+    parser.add_argument('--smoothing', choices=list(SMOOTHERS), default='mean',
+                        help='Angle smoothing filter (mean: average of the last 5 frames)')
+    parser.add_argument('--hysteresis', type=float, default=0.0,
+                        help='Degrees back past a threshold before an activity ends')
+    args = parser.parse_args()
+
+    estimator = HeadPoseEstimator(max_num_faces=args.students, **POSE_MODES[args.pose_mode])
+    logger = ActivityLogger('classroom_activity_log.csv' if args.students == 1 else 'classroom_students_log.csv',
+                            run_length=args.run_length)
+    telemetry = TelemetryWriter(args.telemetry) if args.telemetry else None
+
+    # Start webcam
+    cap = open_camera(count=4, verbose=True)
+    if cap is None:
+        logger.close()
+        if telemetry is not None:
+            telemetry.close()
+        return
+
+    scheduler = None
+    if args.adaptive:
+        camera_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        scheduler = InferenceScheduler(frame_interval=1 / camera_fps, max_stride=args.max_stride)
+    if args.students > 1:
+        monitor = MultiStudentMonitor(estimator, logger, telemetry, scheduler, args.smoothing, args.hysteresis)
+    else:
+        monitor = SingleStudentMonitor(estimator, logger, telemetry, scheduler,
+                                       make_smoother(args.smoothing), args.hysteresis)
+    if args.pipeline:
+        PosePipeline(cap, monitor.infer, monitor.draw, WINDOW_NAME).run()
+    else:
+        run_serial(cap, monitor)
+
+    cap.release()
+    logger.close()
+    if telemetry is not None:
+        telemetry.close()
+    estimator.close()
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Head pose estimation shared by the head_pose_detection scripts
+HeadPoseEstimator runs MediaPipe FaceMesh on a frame (or takes landmarks you
+already have) and solves the head pose from six landmarks with solvePnP.
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Define 3D model points of key landmarks
+MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),             # Nose tip
+    (0.0, -330.0, -65.0),        # Chin
+    (-225.0, 170.0, -135.0),     # Left eye left corner
+    (225.0, 170.0, -135.0),      # Right eye right corner
+    (-150.0, -150.0, -125.0),    # Left mouth corner
+    (150.0, -150.0, -125.0)      # Right mouth corner
+])
+
+# Corresponding indices in MediaPipe's 468-point face mesh
+LANDMARK_IDS = {
+    "nose_tip": 1,
+    "chin": 152,
+    "left_eye_left_corner": 263,
+    "right_eye_right_corner": 33,
+    "left_mouth_corner": 287,
+    "right_mouth_corner": 57
+}
+LANDMARK_INDEX = np.array(list(LANDMARK_IDS.values()))
+
+# 3D positions of the six keypoints of MediaPipe's face detector, in MODEL_POINTS units and axes
+DETECTOR_MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),             # Nose tip
+    (0.0, -150.0, -110.0),       # Mouth centre
+    (-160.0, 170.0, -120.0),     # Left eye centre
+    (160.0, 170.0, -120.0),      # Right eye centre
+    (-300.0, 130.0, -400.0),     # Left ear tragion
+    (300.0, 130.0, -400.0)       # Right ear tragion
+])
+# Face detector keypoints in DETECTOR_MODEL_POINTS order (the detector lists right eye, left eye,
+# nose tip, mouth centre, right ear, left ear), so the nose tip comes first as with the mesh
+DETECTOR_KEYPOINT_INDEX = np.array([2, 3, 1, 0, 5, 4])
+
+# Estimator settings per --pose-mode: the full pipeline, FaceMesh without the iris
+# refinement model, and the face detector's keypoints with no mesh at all
+POSE_MODES = {
+    'accurate': {'refine_landmarks': True},
+    'fast': {'refine_landmarks': False},
+    'detector': {'refine_landmarks': False, 'detector': True}
+}
+
+# Point 1000 units ahead of the nose, projected to draw the facing direction
+NOSE_AXIS = np.array([(0.0, 0.0, 1000.0)])
+
+# Euler angles in degrees, the solvePnP vectors and the six 2D points (in MODEL_POINTS order)
+PoseRecord = namedtuple('PoseRecord', ['pitch', 'yaw', 'roll', 'rotation_vector', 'translation_vector',
+                                       'image_points'])
+
+
+class HeadPoseEstimator:
+    """Head pose from FaceMesh landmarks.
+
+    Camera intrinsics are built once per frame size. Each solve starts from
+    the previous pose (``useExtrinsicGuess``) so the iterative solver only has
+    to correct a frame's worth of motion; the guess is dropped whenever a
+    frame has no face, and the first solve after that uses SQPnP.
+    ``estimate`` works on landmarks alone, so the pose maths can run offline
+    without a camera or MediaPipe.
+
+    With several faces, ``process_faces`` gathers the six points of every
+    face into one (faces, 6, 2) array; each face is then solved with
+    ``solve(points, w, h, key)``, where ``key`` (e.g. a track id) selects
+    which previous pose warm-starts it.
+
+    Only six points feed the solve, so the 478-point mesh is optional: with
+    ``refine_landmarks=False`` FaceMesh skips its iris model, and with
+    ``detector=True`` the six keypoints of MediaPipe's face detector are used
+    against DETECTOR_MODEL_POINTS instead. That is much cheaper but noisier,
+    and its ear keypoints get unreliable at large yaw. See POSE_MODES and
+    pose_accuracy.py.
+    """
+
+    def __init__(self, max_num_faces=1, refine_landmarks=True, warm_start=True, detector=False):
+        self.max_num_faces = max_num_faces
+        self.refine_landmarks = refine_landmarks
+        self.warm_start = warm_start
+        self.detector = detector
+        self.model_points = DETECTOR_MODEL_POINTS if detector else MODEL_POINTS
+        self.face_mesh = None
+        self.face_detection = None
+        self._intrinsics = {}
+        self._guesses = {}
+
+    def _mesh(self):
+        if self.face_mesh is None:
+            import mediapipe as mp
+            self.face_mesh = mp.solutions.face_mesh.FaceMesh(
+                static_image_mode=False, max_num_faces=self.max_num_faces, refine_landmarks=self.refine_landmarks)
+        return self.face_mesh
+
+    def _detection(self):
+        if self.face_detection is None:
+            import mediapipe as mp
+            # Short-range model: faces within about 2 m of the camera
+            self.face_detection = mp.solutions.face_detection.FaceDetection(
+                model_selection=0, min_detection_confidence=0.5)
+        return self.face_detection
+
+    def _landmarks(self, frame):
+        """Per-face landmark lists of a BGR frame, from FaceMesh or the face detector"""
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self.detector:
+            detections = self._detection().process(rgb).detections or []
+            return [detection.location_data.relative_keypoints for detection in detections[:self.max_num_faces]]
+        faces = self._mesh().process(rgb).multi_face_landmarks or []
+        return [face.landmark for face in faces]
+
+    def intrinsics(self, w, h):
+        """(camera_matrix, dist_coeffs) for a frame size: focal length = width, centre = image centre"""
+        cached = self._intrinsics.get((w, h))
+        if cached is None:
+            camera_matrix = np.array([
+                [w, 0, w / 2],
+                [0, w, h / 2],
+                [0, 0, 1]
+            ], dtype="double")
+            cached = self._intrinsics[(w, h)] = (camera_matrix, np.zeros((4, 1)))
+        return cached
+
+    def image_points(self, landmarks, w, h):
+        """The six pose landmarks in pixels, from a landmark list or an (N, 2+) normalised array"""
+        index = DETECTOR_KEYPOINT_INDEX if self.detector else LANDMARK_INDEX
+        if isinstance(landmarks, np.ndarray):
+            points = landmarks[index, :2].astype(np.float64)
+        else:
+            points = np.array([(landmarks[i].x, landmarks[i].y) for i in index], dtype=np.float64)
+        points *= (w, h)
+        return points
+
+    def face_points(self, faces, w, h):
+        """The six pose landmarks of every face's landmark list in pixels, as one (faces, 6, 2) array"""
+        index = DETECTOR_KEYPOINT_INDEX if self.detector else LANDMARK_INDEX
+        points = np.array([[(landmarks[i].x, landmarks[i].y) for i in index] for landmarks in faces],
+                          dtype=np.float64).reshape(-1, len(index), 2)
+        points *= (w, h)
+        return points
+
+    def estimate(self, landmarks, w, h, key=None):
+        """Solve the head pose for one face's landmarks; returns a PoseRecord or None"""
+        return self.solve(self.image_points(landmarks, w, h), w, h, key)
+
+    def solve(self, image_points, w, h, key=None):
+        """Solve the head pose from six (x, y) pixel points in ``model_points`` order"""
+        camera_matrix, dist_coeffs = self.intrinsics(w, h)
+
+        guess = self._guesses.get(key) if self.warm_start else None
+        if guess is not None:
+            success, rotation_vector, translation_vector = cv2.solvePnP(
+                self.model_points, image_points, camera_matrix, dist_coeffs,
+                guess[0].copy(), guess[1].copy(), useExtrinsicGuess=True,
+                flags=cv2.SOLVEPNP_ITERATIVE)
+        else:
+            # Without a guess the iterative solver often lands on the mirrored pose of these shallow
+            # models; SQPnP finds the global optimum
+            success, rotation_vector, translation_vector = cv2.solvePnP(
+                self.model_points, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_SQPNP)
+
+        if not success:
+            self.forget(key)
+            return None
+        self._guesses[key] = (rotation_vector, translation_vector)
+
+        # Convert rotation vector to rotation matrix and euler angles (degrees)
+        rotation_matrix, _ = cv2.Rodrigues(rotation_vector)
+        pitch, yaw, roll = cv2.RQDecomp3x3(rotation_matrix)[0]
+        return PoseRecord(pitch, yaw, roll, rotation_vector, translation_vector, image_points)
+
+    def process(self, frame):
+        """Run FaceMesh (or the detector) on a BGR frame and return the pose of the first face, or None"""
+        h, w = frame.shape[:2]
+        faces = self._landmarks(frame)
+        if not faces:
+            self.reset()
+            return None
+        return self.estimate(faces[0], w, h)
+
+    def process_faces(self, frame):
+        """Run FaceMesh (or the detector) on a BGR frame and return the (faces, 6, 2) pose points of every face"""
+        h, w = frame.shape[:2]
+        return self.face_points(self._landmarks(frame), w, h)
+
+    def nose_direction(self, pose, w, h):
+        """2D end point of the facing direction, for drawing a line from the nose tip"""
+        camera_matrix, dist_coeffs = self.intrinsics(w, h)
+        point, _ = cv2.projectPoints(NOSE_AXIS, pose.rotation_vector, pose.translation_vector,
+                                     camera_matrix, dist_coeffs)
+        return int(point[0][0][0]), int(point[0][0][1])
+
+    def reset(self):
+        """Forget every previous pose, so the next solves start from scratch"""
+        self._guesses.clear()
+
+    def forget(self, key):
+        """Forget the previous pose of one face (e.g. a track that ended)"""
+        self._guesses.pop(key, None)
+
+    def close(self):
+        if self.face_mesh is not None:
+            self.face_mesh.close()
+            self.face_mesh = None
+        if self.face_detection is not None:
+            self.face_detection.close()
+            self.face_detection = None
+
+
+# Try different camera indices
+def try_camera_indices(count=2, verbose=False):
+    for index in range(count):
+        if verbose:
+            print(f"Attempting to open camera at index {index}...")
+        cap = cv2.VideoCapture(index)
+        if cap.isOpened():
+            ret, test_frame = cap.read()
+            if ret:
+                print(f"Successfully opened camera at index {index}")
+                return cap
+            elif verbose:
+                print(f"Camera at index {index} opened but failed to read frame")
+            cap.release()
+        elif verbose:
+            print(f"Failed to open camera at index {index}")
+    if verbose:
+        print("No working camera found after trying all indices")
+    return None
+
+def open_camera(count=2, verbose=False, width=640, height=480):
+    """Open the first working camera at the given size; returns None (after printing why) on failure"""
+    cap = try_camera_indices(count, verbose)
+
+    # Check if camera opened successfully
+    if cap is None:
+        print("Error: Could not open camera.")
+        return None
+
+    # Try to get a frame to ensure camera is working
+    ret, test_frame = cap.read()
+    if not ret:
+        print("Error: Could not read frame from camera.")
+        cap.release()
+        return None
+
+    print("Camera initialized successfully. Press 'q' or 'ESC' to exit.")
+
+    # Set camera properties for better performance
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return cap
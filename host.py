@@ -3,6 +3,7 @@ import threading
 import json
 import cv2
 import numpy as np
+from camera_source import CameraSource
 from handDetector import HandDetector
 
 HOST = "0.0.0.0"   # Listen on all interfaces
@@ -48,8 +49,8 @@ def host_game():
     threading.Thread(target=handle_client, args=(conn,), daemon=True).start()
 
     # Setup OpenCV
-    cap = cv2.VideoCapture(0)
-    detector = HandDetector(detectionCon=0.8, maxHands=1)
+    cap = CameraSource(0)
+    detector = HandDetector(HandNo=1, detectionConfidence=0.8)
     ball_speed = [5, 5]
 
     while True:
@@ -59,9 +60,11 @@ def host_game():
         frame = cv2.flip(frame, 1)
 
         # Detect host's paddle (left side)
-        hands, _ = detector.findHands(frame, flipType=False, draw=False)
-        if hands:
-            y = hands[0]["center"][1]
+        detector.process(frame, draw=False, timestamp=cap.timestamp)
+        boxes = detector.boundingboxes()
+        if len(boxes):
+            # Centre of the hand's bounding box
+            y = int(boxes[0, 1] + boxes[0, 3]) // 2
             with lock:
                 game_state["paddle_left"] = y
 
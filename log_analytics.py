@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Offline analytics for the head pose activity logs
+Streams head_pose_log.csv / classroom_activity_log.csv style logs (plain,
+rotated or gzip'd) in fixed-size chunks and reports per-session and
+per-time-bucket focus ratios, distraction episodes and writing time.
+
+Accepted row layouts:
+- timestamp,label: one row per observation (the default logs)
+- start,end,duration_seconds,label: run-length rows (--run-length logging)
+- either of the above with a student id column before the label (multi-student
+  classroom logs), reported per student
+
+Usage: python log_analytics.py <files or directories> [--output report.json]
+"""
+
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+# Activity categories every label is reduced to
+OTHER, FOCUSED, WRITING, DISTRACTED = range(4)
+CATEGORY_NAMES = ('other', 'focused', 'writing', 'distracted')
+LOOKING_AWAY = {'Looking Up', 'Looking Down', 'Turned Left', 'Turned Right'}
+
+def categorise(label):
+    if label.startswith('Writing'):
+        return WRITING
+    if label.startswith('Distracted') or label in LOOKING_AWAY:
+        return DISTRACTED
+    if label in ('Focused', 'Viewing Board'):
+        return FOCUSED
+    return OTHER
+
+def categorise_labels(labels):
+    """Category code per label; each distinct label is only looked at once"""
+    unique, inverse = np.unique(np.asarray(labels, dtype=object), return_inverse=True)
+    return np.array([categorise(label) for label in unique], dtype=np.int8)[inverse]
+
+def parse_times(values):
+    """Seconds since the epoch (as written, i.e. local time) of 'YYYY-MM-DD HH:MM:SS[.ffffff]' strings"""
+    return np.array(values, dtype='datetime64[us]').astype(np.int64) / 1e6
+
+
+class LogAnalyzer:
+    """Streaming accumulator over (start, duration, category) intervals.
+
+    Chunks are folded in with NumPy (run boundaries from shifted comparisons,
+    totals from ``bincount``), carrying only the open session and the open
+    distraction episode from one chunk to the next, so memory stays constant
+    however long the log is.
+
+    A new session starts after ``session_gap`` seconds without rows. Timestamp
+    rows are turned into intervals reaching to the next row: capped at
+    ``max_sample_gap`` for per-frame logs, or, with ``labels_mark_end`` (logs
+    written when an activity ends, like the classroom monitor's), covering the
+    whole gap before the row.
+    """
+
+    def __init__(self, bucket_seconds=300, session_gap=300, max_sample_gap=2.0, labels_mark_end=False):
+        self.bucket_seconds = bucket_seconds
+        self.session_gap = session_gap
+        self.max_sample_gap = max_sample_gap
+        self.labels_mark_end = labels_mark_end
+
+        self.sessions = []
+        self.buckets = {}
+        self._last_sample = None
+        self._last_end = None
+        self._last_distracted = False
+        self._open_episode = None
+
+    def feed_samples(self, times, categories):
+        """Add timestamp,label rows (times in seconds, in order)"""
+        if self._last_sample is not None:
+            times = np.concatenate(([self._last_sample[0]], times))
+            categories = np.concatenate(([self._last_sample[1]], categories))
+        if len(times) == 0:
+            return
+        self._last_sample = (times[-1], categories[-1])
+        if len(times) < 2:
+            return
+
+        gaps = np.diff(times)
+        if self.labels_mark_end:
+            durations = np.where(gaps <= self.session_gap, gaps, 0.0)
+            categories = categories[1:]
+        else:
+            durations = np.minimum(gaps, self.max_sample_gap)
+            categories = categories[:-1]
+        self.feed_intervals(times[:-1], durations, categories)
+
+    def feed_intervals(self, starts, durations, categories):
+        """Add (start, duration, category) intervals, in order"""
+        n = len(starts)
+        if n == 0:
+            return
+        ends = starts + durations
+
+        # Session boundaries
+        previous_end = np.empty(n)
+        previous_end[0] = -np.inf if self._last_end is None else self._last_end
+        previous_end[1:] = ends[:-1]
+        gaps = starts - previous_end
+        new_session = gaps > self.session_gap
+        session_ids = np.cumsum(new_session) + len(self.sessions) - 1
+        for index in np.flatnonzero(new_session):
+            self.sessions.append(self._new_session(starts[index]))
+
+        # Time per session and category
+        first = len(self.sessions) - 1 - int(new_session.sum())
+        local = session_ids - first
+        totals = np.bincount(local * 4 + categories, weights=durations,
+                             minlength=(local[-1] + 1) * 4).reshape(-1, 4)
+        last_ends = np.zeros(local[-1] + 1)
+        np.maximum.at(last_ends, local, ends)
+        for offset, (session_totals, session_end) in enumerate(zip(totals, last_ends)):
+            if first + offset < 0:
+                continue
+            session = self.sessions[first + offset]
+            for category, name in enumerate(CATEGORY_NAMES):
+                session[name + '_seconds'] += float(session_totals[category])
+            session['end'] = max(session['end'], float(session_end))
+
+        # Distraction episodes: runs of distracted intervals with no gap and no session break
+        distracted = categories == DISTRACTED
+        previous_distracted = np.empty(n, dtype=bool)
+        previous_distracted[0] = self._last_distracted
+        previous_distracted[1:] = distracted[:-1]
+        continues = previous_distracted & (gaps <= self.max_sample_gap) & ~new_session
+        episode_start = distracted & ~continues
+        episode_ids = np.cumsum(episode_start)
+        episode_seconds = np.bincount(episode_ids[distracted], weights=durations[distracted],
+                                      minlength=episode_ids[-1] + 1)
+
+        # Episode 0 continues the one carried over from the previous chunk
+        episodes = []
+        if self._open_episode is not None:
+            self._open_episode[1] += episode_seconds[0]
+            episodes.append(self._open_episode)
+        for episode_id, index in enumerate(np.flatnonzero(episode_start), start=1):
+            episodes.append([int(session_ids[index]), float(episode_seconds[episode_id])])
+
+        self._open_episode = episodes.pop() if distracted[-1] else None
+        for session_index, seconds in episodes:
+            self._close_episode(session_index, seconds)
+
+        # Time per bucket and category
+        bucket_ids = (starts // self.bucket_seconds).astype(np.int64)
+        low = bucket_ids.min()
+        bucket_totals = np.bincount((bucket_ids - low) * 4 + categories, weights=durations,
+                                    minlength=(bucket_ids.max() - low + 1) * 4).reshape(-1, 4)
+        for offset in np.flatnonzero(bucket_totals.any(axis=1)):
+            bucket = self.buckets.setdefault(int(low + offset), np.zeros(4))
+            bucket += bucket_totals[offset]
+
+        self._last_end = float(ends[-1])
+        self._last_distracted = bool(distracted[-1])
+
+    def _new_session(self, start):
+        session = {'start': float(start), 'end': float(start), 'episodes': 0, 'episode_seconds': 0.0,
+                   'longest_episode_seconds': 0.0}
+        for name in CATEGORY_NAMES:
+            session[name + '_seconds'] = 0.0
+        return session
+
+    def _close_episode(self, session_index, seconds):
+        session = self.sessions[session_index]
+        session['episodes'] += 1
+        session['episode_seconds'] += seconds
+        session['longest_episode_seconds'] = max(session['longest_episode_seconds'], seconds)
+
+    def report(self):
+        """Close any open episode and return sessions, buckets and overall totals"""
+        if self._open_episode is not None:
+            self._close_episode(*self._open_episode)
+            self._open_episode = None
+
+        def focus_ratio(focused, writing, distracted):
+            on_task = focused + writing
+            return round(on_task / (on_task + distracted), 3) if on_task + distracted else None
+
+        sessions = []
+        for session in self.sessions:
+            summary = {
+                'start': format_time(session['start']),
+                'end': format_time(session['end']),
+                'duration_seconds': round(session['end'] - session['start'], 1),
+                'focus_ratio': focus_ratio(session['focused_seconds'], session['writing_seconds'],
+                                           session['distracted_seconds']),
+                'writing_seconds': round(session['writing_seconds'], 1),
+                'distracted_seconds': round(session['distracted_seconds'], 1),
+                'distraction_episodes': session['episodes'],
+                'mean_episode_seconds': round(session['episode_seconds'] / session['episodes'], 2)
+                if session['episodes'] else 0.0,
+                'longest_episode_seconds': round(session['longest_episode_seconds'], 2)
+            }
+            sessions.append(summary)
+
+        buckets = [{
+            'start': format_time(bucket * self.bucket_seconds),
+            'focus_ratio': focus_ratio(totals[FOCUSED], totals[WRITING], totals[DISTRACTED]),
+            'writing_seconds': round(float(totals[WRITING]), 1),
+            'distracted_seconds': round(float(totals[DISTRACTED]), 1)
+        } for bucket, totals in sorted(self.buckets.items())]
+
+        totals = {name: round(sum(session[name + '_seconds'] for session in self.sessions), 1)
+                  for name in CATEGORY_NAMES}
+        totals['focus_ratio'] = focus_ratio(totals['focused'], totals['writing'], totals['distracted'])
+        totals['distraction_episodes'] = sum(session['episodes'] for session in self.sessions)
+        return {'totals': totals, 'sessions': sessions, 'buckets': buckets}
+
+
+def format_time(seconds):
+    return str(np.datetime64(int(seconds * 1e6), 'us')).replace('T', ' ')
+
+def open_log(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
+
+# Column count -> (layout, has a student id column)
+LAYOUTS = {2: ('samples', False), 3: ('samples', True), 4: ('run_length', False), 5: ('run_length', True)}
+
+def _feed(analyzer, layout, columns, rows=slice(None)):
+    if layout == 'run_length':
+        analyzer.feed_intervals(parse_times(np.asarray(columns[0])[rows]),
+                                np.asarray(columns[2], dtype=np.float64)[rows],
+                                categorise_labels(np.asarray(columns[-1], dtype=object)[rows]))
+    else:
+        analyzer.feed_samples(parse_times(np.asarray(columns[0])[rows]),
+                              categorise_labels(np.asarray(columns[-1], dtype=object)[rows]))
+
+def analyze_file(path, chunk_rows=100000, **options):
+    """Stream one log through a LogAnalyzer (one per student for keyed logs), ``chunk_rows`` rows at a time"""
+    analyzers = {}
+    rows_read = 0
+    layout = keyed = None
+    with open_log(path) as f:
+        reader = csv.reader(f)
+        while True:
+            rows = [row for row in islice(reader, chunk_rows) if row]
+            if not rows:
+                break
+            rows_read += len(rows)
+            if layout is None:
+                layout, keyed = LAYOUTS.get(len(rows[0]), LAYOUTS[2])
+
+            columns = list(zip(*rows))
+            if not keyed:
+                _feed(analyzers.setdefault(None, LogAnalyzer(**options)), layout, columns)
+                continue
+
+            # Split the chunk by student, keeping each student's rows in order
+            keys, inverse = np.unique(np.asarray(columns[-2], dtype=object), return_inverse=True)
+            for index, key in enumerate(keys):
+                _feed(analyzers.setdefault(key, LogAnalyzer(**options)), layout, columns, inverse == index)
+
+    if keyed:
+        report = {'students': {key: analyzer.report() for key, analyzer in sorted(analyzers.items())}}
+        report['sessions'] = [dict(session, student=key) for key, student in report['students'].items()
+                              for session in student['sessions']]
+        report['totals'] = combine_totals([student['totals'] for student in report['students'].values()])
+    else:
+        report = analyzers[None].report() if analyzers else LogAnalyzer(**options).report()
+    report.update({'file': path, 'layout': layout, 'rows': rows_read})
+    return report
+
+def combine_totals(totals):
+    combined = {name: round(sum(t[name] for t in totals), 1) for name in CATEGORY_NAMES}
+    on_task = combined['focused'] + combined['writing']
+    combined['focus_ratio'] = round(on_task / (on_task + combined['distracted']), 3) \
+        if on_task + combined['distracted'] else None
+    combined['distraction_episodes'] = sum(t['distraction_episodes'] for t in totals)
+    return combined
+
+def find_logs(paths):
+    """Expand directories to the .csv logs in them, including rotated (.csv.1) and gzip'd archives"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ('*.csv', '*.csv.*'):
+                files.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+def main():
+    parser = argparse.ArgumentParser(description='Focus and distraction analytics for head pose activity logs')
+    parser.add_argument('paths', nargs='+', help='Log files or directories of logs')
+    parser.add_argument('--bucket-minutes', type=float, default=5, help='Width of the time buckets')
+    parser.add_argument('--session-gap', type=float, default=300,
+                        help='Seconds without rows that start a new session')
+    parser.add_argument('--max-sample-gap', type=float, default=2.0,
+                        help='Longest time a per-frame row is assumed to cover')
+    parser.add_argument('--labels-mark-end', action='store_true',
+                        help='Rows are written when an activity ends (classroom_activity_log.csv)')
+    parser.add_argument('--chunk-rows', type=int, default=100000, help='Rows read per chunk')
+    parser.add_argument('--workers', type=int, default=None, help='Processes (default: one per CPU)')
+    parser.add_argument('--output', help='Write the full report as JSON to this file')
+    args = parser.parse_args()
+
+    files = find_logs(args.paths)
+    if not files:
+        parser.error('No log files found')
+
+    options = {
+        'chunk_rows': args.chunk_rows,
+        'bucket_seconds': args.bucket_minutes * 60,
+        'session_gap': args.session_gap,
+        'max_sample_gap': args.max_sample_gap,
+        'labels_mark_end': args.labels_mark_end
+    }
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [(path, pool.submit(analyze_file, path, **options)) for path in files]
+        reports = []
+        for path, future in futures:
+            try:
+                reports.append(future.result())
+            except (ValueError, IndexError) as e:
+                print(f"Skipping {path}: {e}")
+
+    for report in reports:
+        totals = report['totals']
+        ratio = 'n/a' if totals['focus_ratio'] is None else f"{totals['focus_ratio']:.1%}"
+        print(f"\n{report['file']} ({report['rows']} rows, {len(report['sessions'])} sessions)")
+        print(f"  focus {ratio}, writing {totals['writing']:.0f}s, distracted {totals['distracted']:.0f}s "
+              f"in {totals['distraction_episodes']} episodes")
+        for session in report['sessions']:
+            ratio = 'n/a' if session['focus_ratio'] is None else f"{session['focus_ratio']:.1%}"
+            student = f"student {session['student']:>4}  " if 'student' in session else ''
+            print(f"  {student}{session['start']}  {session['duration_seconds']:8.0f}s  focus {ratio:>6}  "
+                  f"episodes {session['distraction_episodes']:4d} (mean {session['mean_episode_seconds']:.1f}s)  "
+                  f"writing {session['writing_seconds']:.0f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == "__main__":
+    main()
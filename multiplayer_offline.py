@@ -107,92 +107,89 @@ def run():
     cv2.destroyAllWindows()
  """
 import cv2
-import mediapipe as mp
-import numpy as np
-
-# Hand tracking setup
-mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(max_num_hands=2, min_detection_confidence=0.7)
-mp_draw = mp.solutions.drawing_utils
-
-# Webcam setup
-cap = cv2.VideoCapture(0)
-cap.set(3, 640)
-cap.set(4, 480)
-
-# Game variables
-ball_pos = [320, 240]
-ball_speed = [4, 4]
-paddle_height = 100
-paddle_width = 15
-left_paddle_y = 240
-right_paddle_y = 240
-score_left = 0
-score_right = 0
-
-while True:
-    success, frame = cap.read()
-    if not success:
-        break
-
-    # Flip feed like a mirror
-    frame = cv2.flip(frame, 1)
-    h, w, _ = frame.shape
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    # Detect hands
-    results = hands.process(rgb)
-    if results.multi_hand_landmarks and results.multi_handedness:
-        for hand_landmarks, handedness in zip(results.multi_hand_landmarks, results.multi_handedness):
-            cx = int(hand_landmarks.landmark[8].x * w)  # index fingertip X
-            cy = int(hand_landmarks.landmark[8].y * h)  # index fingertip Y
-
-            if handedness.classification[0].label == "Left":
+
+from camera_source import CameraSource
+from handDetector import HANDEDNESS, HandDetector
+
+def run():
+    # Hand tracking setup
+    detector = HandDetector(HandNo=2, detectionConfidence=0.7)
+
+    # Webcam setup
+    cap = CameraSource(0, width=640, height=480)
+
+    # Game variables
+    ball_pos = [320, 240]
+    ball_speed = [4, 4]
+    paddle_height = 100
+    paddle_width = 15
+    left_paddle_y = 240
+    right_paddle_y = 240
+    score_left = 0
+    score_right = 0
+
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+
+        # Flip feed like a mirror
+        frame = cv2.flip(frame, 1)
+        h, w, _ = frame.shape
+
+        # Detect hands
+        detector.process(frame, draw=False, timestamp=cap.timestamp)
+        tips = detector.pixels()[:, 8]  # index fingertips
+        for (cx, cy), handedness in zip(tips.tolist(), detector.handedness()):
+            if HANDEDNESS[handedness] == "Left":
                 left_paddle_y = max(0, min(h - paddle_height, cy - paddle_height // 2))
             else:
                 right_paddle_y = max(0, min(h - paddle_height, cy - paddle_height // 2))
 
-    # --- Ball update ---
-    ball_pos[0] += ball_speed[0]
-    ball_pos[1] += ball_speed[1]
-
-    # Bounce on top/bottom
-    if ball_pos[1] <= 0 or ball_pos[1] >= h:
-        ball_speed[1] *= -1
-
-    # Bounce on paddles
-    if (ball_pos[0] <= paddle_width and 
-        left_paddle_y < ball_pos[1] < left_paddle_y + paddle_height):
-        ball_speed[0] *= -1
-
-    if (ball_pos[0] >= w - paddle_width and 
-        right_paddle_y < ball_pos[1] < right_paddle_y + paddle_height):
-        ball_speed[0] *= -1
-
-    # Score check
-    if ball_pos[0] < 0:
-        score_right += 1
-        ball_pos = [w // 2, h // 2]
-    elif ball_pos[0] > w:
-        score_left += 1
-        ball_pos = [w // 2, h // 2]
-
-    # --- Draw paddles and ball ---
-    cv2.rectangle(frame, (0, left_paddle_y), (paddle_width, left_paddle_y + paddle_height), (255, 0, 0), -1)
-    cv2.rectangle(frame, (w - paddle_width, right_paddle_y), (w, right_paddle_y + paddle_height), (0, 0, 255), -1)
-    cv2.circle(frame, tuple(map(int, ball_pos)), 8, (0, 255, 0), -1)  # smaller ball
-
-    # --- Draw scores ---
-    cv2.putText(frame, f"{score_left}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
-    cv2.putText(frame, f"{score_right}", (w-100, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
-
-    # Show frame
-    cv2.imshow("CV Pong", frame)
-
-    # Quit on 'q'
-    key = cv2.waitKey(1) & 0xFF
-    if key == ord('q'):
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+        # --- Ball update ---
+        ball_pos[0] += ball_speed[0]
+        ball_pos[1] += ball_speed[1]
+
+        # Bounce on top/bottom
+        if ball_pos[1] <= 0 or ball_pos[1] >= h:
+            ball_speed[1] *= -1
+
+        # Bounce on paddles
+        if (ball_pos[0] <= paddle_width and 
+            left_paddle_y < ball_pos[1] < left_paddle_y + paddle_height):
+            ball_speed[0] *= -1
+
+        if (ball_pos[0] >= w - paddle_width and 
+            right_paddle_y < ball_pos[1] < right_paddle_y + paddle_height):
+            ball_speed[0] *= -1
+
+        # Score check
+        if ball_pos[0] < 0:
+            score_right += 1
+            ball_pos = [w // 2, h // 2]
+        elif ball_pos[0] > w:
+            score_left += 1
+            ball_pos = [w // 2, h // 2]
+
+        # --- Draw paddles and ball ---
+        cv2.rectangle(frame, (0, left_paddle_y), (paddle_width, left_paddle_y + paddle_height), (255, 0, 0), -1)
+        cv2.rectangle(frame, (w - paddle_width, right_paddle_y), (w, right_paddle_y + paddle_height), (0, 0, 255), -1)
+        cv2.circle(frame, tuple(map(int, ball_pos)), 8, (0, 255, 0), -1)  # smaller ball
+
+        # --- Draw scores ---
+        cv2.putText(frame, f"{score_left}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
+        cv2.putText(frame, f"{score_right}", (w-100, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
+
+        # Show frame
+        cv2.imshow("CV Pong", frame)
+
+        # Quit on 'q'
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            break
+
+    cap.release()
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Accuracy and speed of the cheaper pose modes on recorded clips
+Runs every frame of each clip through the full pipeline ('accurate': FaceMesh
+with iris refinement) and through the faster POSE_MODES, then reports how far
+each mode's angles are from the full pipeline, how often it finds the face, how
+often the classroom monitor's activity would differ, and the frames per second
+it manages.
+
+Usage: python pose_accuracy.py lecture1.mp4 frames_dir/ [--modes fast detector]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from classroom_activity import determine_activity
+from head_pose_estimator import POSE_MODES, HeadPoseEstimator
+from pose_batch import FrameReader
+from pose_smoothing import make_smoother
+
+
+def measure(sources, modes, fps=30.0):
+    """Per mode: (n, 3) angles (NaN without a face), seconds spent in process()"""
+    angles = {mode: [] for mode in modes}
+    seconds = dict.fromkeys(modes, 0.0)
+    estimators = {mode: HeadPoseEstimator(**POSE_MODES[mode]) for mode in modes}
+    try:
+        for source in sources:
+            # Each clip starts without a previous pose to warm-start from
+            for estimator in estimators.values():
+                estimator.reset()
+            reader = FrameReader(source, fps=fps)
+            try:
+                for _, frame in reader:
+                    for mode, estimator in estimators.items():
+                        started = time.perf_counter()
+                        pose = estimator.process(frame)
+                        seconds[mode] += time.perf_counter() - started
+                        angles[mode].append((np.nan,) * 3 if pose is None else (pose.pitch, pose.yaw, pose.roll))
+            finally:
+                reader.close()
+    finally:
+        for estimator in estimators.values():
+            estimator.close()
+    return {mode: np.array(rows).reshape(-1, 3) for mode, rows in angles.items()}, seconds
+
+def activities(angles):
+    """The classroom monitor's activity per frame (5-frame mean smoothing); None without a face"""
+    smoother, labels = make_smoother('mean'), []
+    for pitch, yaw, roll in angles:
+        if np.isnan(pitch):
+            labels.append(None)
+        else:
+            smoothed = smoother.update((pitch, yaw, roll))
+            labels.append(determine_activity(smoothed[0], smoothed[1]))
+    return np.array(labels, dtype=object)
+
+def angle_error(a, b):
+    """Signed difference in degrees, wrapped into [-180, 180) (pitch sits near +-180 for a frontal face)"""
+    return (a - b + 180) % 360 - 180
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the fast pose modes with the full pipeline')
+    parser.add_argument('sources', nargs='+', help='Video files or directories of frames')
+    parser.add_argument('--modes', nargs='+', choices=[mode for mode in POSE_MODES if mode != 'accurate'],
+                        default=['fast', 'detector'], help='Modes to compare with the accurate one')
+    parser.add_argument('--fps', type=float, default=30.0, help='Frame rate of frame directories')
+    args = parser.parse_args()
+
+    modes = ['accurate'] + args.modes
+    angles, seconds = measure(args.sources, modes, args.fps)
+    frames = len(angles['accurate'])
+    if frames == 0:
+        print("No frames read")
+        return
+
+    reference = angles['accurate']
+    reference_found = ~np.isnan(reference[:, 0])
+    reference_labels = activities(reference)
+    print(f"{frames} frames, face in {reference_found.sum()} with the accurate mode")
+    print(f"{'mode':<10} {'fps':>6} {'found':>6} {'extra':>6} {'pitch':>13} {'yaw':>13} {'roll':>13} {'activity':>9}")
+    print(f"{'':<10} {'':>6} {'':>6} {'':>6} {'MAE / bias':>13} {'MAE / bias':>13} {'MAE / bias':>13} {'agrees':>9}")
+    for mode in modes:
+        found = ~np.isnan(angles[mode][:, 0])
+        both = found & reference_found
+        errors = angle_error(angles[mode][both], reference[both])
+        columns = [f"{np.abs(errors[:, axis]).mean():5.1f} / {errors[:, axis].mean():+5.1f}" if both.any()
+                   else 'n/a' for axis in range(3)]
+        labels = activities(angles[mode])
+        agrees = (labels[both] == reference_labels[both]).mean() if both.any() else float('nan')
+        print(f"{mode:<10} {frames / seconds[mode]:>6.1f} "
+              f"{(found & reference_found).sum() / max(reference_found.sum(), 1):>6.1%} "
+              f"{(found & ~reference_found).sum():>6} "
+              f"{columns[0]:>13} {columns[1]:>13} {columns[2]:>13} {agrees:>9.1%}")
+
+if __name__ == "__main__":
+    main()
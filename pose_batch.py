@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Offline head pose analysis of recorded lectures and exams
+Runs the classroom monitor's pose and activity pipeline over video files or
+directories of frames as fast as the CPU allows: frames are decoded on a
+reader thread ahead of inference, nothing is drawn or shown, and several
+inputs are processed in parallel, one per worker process. Each input gets its
+own activity log (and optionally a telemetry file) in the output directory.
+
+Usage: python pose_batch.py lecture1.mp4 lecture2.mp4 frames_dir/ --output-dir logs
+"""
+
+import argparse
+import datetime
+import glob
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from activity_logger import ActivityLogger
+from classroom_activity import determine_activity
+from head_pose_estimator import POSE_MODES, HeadPoseEstimator
+from pose_telemetry import TelemetryWriter
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+_END = object()
+
+
+class FrameReader:
+    """Decodes a video file or frame directory on a background thread.
+
+    Up to ``prefetch`` decoded frames are queued ahead of the consumer.
+    Iterating yields (seconds_from_start, frame); frame directories are
+    timed at ``fps``.
+    """
+
+    def __init__(self, source, prefetch=32, fps=30.0):
+        self.source = source
+        self.fps = fps
+        self._frames = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self):
+        try:
+            if os.path.isdir(self.source):
+                paths = sorted(path for path in glob.glob(os.path.join(self.source, '*'))
+                               if path.lower().endswith(IMAGE_EXTENSIONS))
+                for index, path in enumerate(paths):
+                    frame = cv2.imread(path)
+                    if frame is not None and not self._put((index / self.fps, frame)):
+                        return
+            else:
+                cap = cv2.VideoCapture(self.source)
+                fps = cap.get(cv2.CAP_PROP_FPS) or self.fps
+                index = 0
+                while not self._stop.is_set():
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if not self._put((index / fps, frame)):
+                        break
+                    index += 1
+                cap.release()
+        finally:
+            self._put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self._frames.get()
+            if item is _END:
+                return
+            yield item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def recording_start(source, fps=30.0):
+    """When the recording began, from file times: the earliest frame of a directory,
+    or a video's modification time (when it finished writing) minus its duration"""
+    if os.path.isdir(source):
+        paths = [path for path in glob.glob(os.path.join(source, '*')) if path.lower().endswith(IMAGE_EXTENSIONS)]
+        return datetime.datetime.fromtimestamp(min(map(os.path.getmtime, paths), default=os.path.getmtime(source)))
+
+    cap = cv2.VideoCapture(source)
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    duration = frame_count / (cap.get(cv2.CAP_PROP_FPS) or fps) if frame_count > 0 else 0.0
+    cap.release()
+    return datetime.datetime.fromtimestamp(os.path.getmtime(source) - duration)
+
+def output_stem(source, output_dir):
+    name = os.path.basename(os.path.normpath(source))
+    return os.path.join(output_dir, os.path.splitext(name)[0])
+
+def analyze_source(source, output_dir, run_length=False, telemetry=False, prefetch=32, fps=30.0,
+                   pose_mode='accurate', started_at=None):
+    """Run pose estimation over one video or frame directory and write its logs; returns a summary.
+
+    Rows are timestamped from ``started_at`` (a datetime), or from
+    recording_start() when it is None.
+    """
+    # One process per input: keep OpenCV from spawning a thread pool in every worker
+    cv2.setNumThreads(1)
+
+    stem = output_stem(source, output_dir)
+    # Re-running an input replaces its logs instead of appending to them
+    for path in (stem + '_activity_log.csv', stem + '.ptl'):
+        if os.path.exists(path):
+            os.remove(path)
+    if started_at is None:
+        started_at = recording_start(source, fps)
+    estimator = HeadPoseEstimator(**POSE_MODES[pose_mode])
+    logger = ActivityLogger(stem + '_activity_log.csv', run_length=run_length)
+    writer = TelemetryWriter(stem + '.ptl', start_time=started_at.timestamp()) if telemetry else None
+    reader = FrameReader(source, prefetch, fps)
+
+    pitch_vals = deque(maxlen=5)
+    yaw_vals = deque(maxlen=5)
+    frames = faces = 0
+    start = time.perf_counter()
+    try:
+        for seconds, frame in reader:
+            frames += 1
+            pose = estimator.process(frame)
+            timestamp = started_at + datetime.timedelta(seconds=seconds)
+            if pose is None:
+                if writer is not None:
+                    writer.write(None, 'No Face', timestamp_ns=int(seconds * 1e9))
+                continue
+
+            faces += 1
+            pitch_vals.append(pose.pitch)
+            yaw_vals.append(pose.yaw)
+            activity = determine_activity(sum(pitch_vals) / len(pitch_vals), sum(yaw_vals) / len(yaw_vals))
+            logger.log(activity, timestamp)
+            if writer is not None:
+                writer.write(pose, activity, timestamp_ns=int(seconds * 1e9))
+    finally:
+        reader.close()
+        logger.close()
+        estimator.close()
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'source': source,
+        'frames': frames,
+        'frames_with_face': faces,
+        'seconds': round(elapsed, 2),
+        'fps': round(frames / elapsed, 1) if elapsed else 0.0,
+        'log': stem + '_activity_log.csv'
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch head pose analysis of videos and frame directories')
+    parser.add_argument('sources', nargs='+', help='Video files or directories of frames')
+    parser.add_argument('--output-dir', default='pose_logs', help='Where the per-input logs are written')
+    parser.add_argument('--workers', type=int, default=None, help='Inputs processed in parallel (default: CPUs)')
+    parser.add_argument('--prefetch', type=int, default=32, help='Frames decoded ahead of inference')
+    parser.add_argument('--fps', type=float, default=30.0,
+                        help='Frame rate of frame directories (and of videos that do not report one)')
+    parser.add_argument('--run-length', action='store_true', help='Log one row per activity instead of per frame')
+    parser.add_argument('--telemetry', action='store_true', help='Also write a .ptl pose telemetry file per input')
+    parser.add_argument('--pose-mode', choices=list(POSE_MODES), default='accurate',
+                        help='fast: FaceMesh without iris refinement; detector: face detector keypoints only')
+    parser.add_argument('--start', type=datetime.datetime.fromisoformat, default=None,
+                        help='When the recording began (ISO 8601, e.g. 2024-05-02T09:00); applied to every input. '
+                             'Default: the video\'s modification time minus its duration, or a frame '
+                             'directory\'s earliest frame time')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stems = [output_stem(source, args.output_dir) for source in args.sources]
+    if len(set(stems)) != len(stems):
+        parser.error('Inputs must have distinct names, their logs would overwrite each other')
+
+    workers = min(args.workers or os.cpu_count() or 1, len(args.sources))
+    options = (args.output_dir, args.run_length, args.telemetry, args.prefetch, args.fps, args.pose_mode,
+               args.start)
+    # Spawned workers each load their own FaceMesh
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [(source, pool.submit(analyze_source, source, *options)) for source in args.sources]
+        for source, future in futures:
+            try:
+                summary = future.result()
+            except Exception as e:
+                print(f"{source}: failed ({e})")
+                continue
+            print(f"{source}: {summary['frames']} frames ({summary['frames_with_face']} with a face) "
+                  f"in {summary['seconds']:.1f}s, {summary['fps']:.1f} fps -> {summary['log']}")
+
+if __name__ == "__main__":
+    main()
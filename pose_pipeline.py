@@ -0,0 +1,130 @@
+"""
+Three-stage capture / inference / render pipeline for the live pose monitors
+A CameraSource thread keeps decoding camera frames into a preallocated ring, an
+inference thread always takes the newest one, and the calling (GUI) thread
+draws and shows each result as soon as it is ready. Camera I/O, FaceMesh and
+imshow/waitKey no longer wait on each other.
+"""
+
+import threading
+import time
+
+import cv2
+
+from camera_source import CameraSource
+
+
+class StageStats:
+    """Smoothed throughput and latency of one pipeline stage"""
+
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self.interval = None
+        self.latency = None
+        self._last = None
+
+    def tick(self, latency=None):
+        now = time.perf_counter()
+        if self._last is not None:
+            interval = now - self._last
+            self.interval = interval if self.interval is None else \
+                self.interval + self.smoothing * (interval - self.interval)
+        self._last = now
+        if latency is not None:
+            self.latency = latency if self.latency is None else \
+                self.latency + self.smoothing * (latency - self.latency)
+
+    @property
+    def fps(self):
+        return 1 / self.interval if self.interval else 0.0
+
+    def describe(self, name):
+        text = f"{name} {self.fps:5.1f} fps"
+        if self.latency is not None:
+            text += f" {self.latency * 1000:5.1f} ms"
+        return text
+
+
+class PosePipeline:
+    """Runs ``infer(frame, captured_at)`` and ``draw(frame, result)`` as decoupled stages over a camera.
+
+    ``infer`` runs on its own thread and must not touch the GUI; ``draw`` runs
+    on the thread that calls ``run`` and draws onto the frame in place. Frames
+    that arrive while inference is busy are skipped, so results are always
+    for the newest frame. ``captured_at`` is the time.monotonic() the frame
+    was read at. ``stats`` holds each stage's throughput and latency
+    (capture: read time, inference: FaceMesh + pose time, render: capture to
+    display).
+    """
+
+    def __init__(self, cap, infer, draw, window, slots=6):
+        self.cap = cap
+        self.infer = infer
+        self.draw = draw
+        self.window = window
+        self.stats = {'capture': StageStats(), 'inference': StageStats(), 'render': StageStats()}
+        self.source = CameraSource(cap=cap, slots=slots, stats=self.stats['capture'])
+        self.ring = None
+        self._ready = None
+        self._ready_cond = threading.Condition()
+
+    def _inference_loop(self):
+        stats = self.stats['inference']
+        sequence = -1
+        while True:
+            slot = self.ring.acquire_latest(sequence)
+            if slot is None:
+                break
+            sequence = self.ring.sequence[slot]
+            started = time.perf_counter()
+            result = self.infer(self.ring.frames[slot], self.ring.captured_at[slot])
+            stats.tick(time.perf_counter() - started)
+
+            with self._ready_cond:
+                # The renderer has not taken the previous result yet: only the newest is shown
+                if self._ready is not None:
+                    self.ring.release(self._ready[0])
+                self._ready = (slot, result)
+                self._ready_cond.notify()
+
+        with self._ready_cond:
+            self._ready_cond.notify()
+
+    def describe_stats(self):
+        return [self.stats[name].describe(name) for name in ('capture', 'inference', 'render')]
+
+    def run(self):
+        """Start capture and inference, then render on this thread until 'q'/ESC or the camera ends"""
+        if not self.source.start():
+            return
+        self.ring = self.source.ring
+        inference = threading.Thread(target=self._inference_loop, daemon=True)
+        inference.start()
+
+        render = self.stats['render']
+        try:
+            while True:
+                with self._ready_cond:
+                    # Time out regularly so the window keeps handling events
+                    self._ready_cond.wait_for(lambda: self._ready is not None or self.ring.closed, timeout=0.05)
+                    ready, self._ready = self._ready, None
+
+                if ready is not None:
+                    slot, result = ready
+                    frame = self.ring.frames[slot]
+                    self.draw(frame, result)
+                    for row, text in enumerate(self.describe_stats()):
+                        cv2.putText(frame, text, (10, frame.shape[0] - 70 + row * 25),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+                    cv2.imshow(self.window, frame)
+                    render.tick(time.monotonic() - self.ring.captured_at[slot])
+                    self.ring.release(slot)
+                elif self.ring.closed:
+                    break
+
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q') or key == 27:  # Press 'q' or ESC to exit
+                    break
+        finally:
+            self.source.stop()
+            inference.join(timeout=2)
@@ -0,0 +1,93 @@
+"""
+Adaptive inference skipping for the live pose monitors
+InferenceScheduler decides which frames run FaceMesh. While the head is still
+it runs on every k-th frame only, and k goes up when one inference takes
+longer than a camera frame. Frames in between reuse the last pose, held or
+extrapolated.
+"""
+
+import math
+
+import numpy as np
+
+
+class InferenceScheduler:
+    """Chooses the frames that get a full inference.
+
+    After each inference whose angles moved less than ``stable_degrees``
+    from the previous one, the stride k grows by one, up to ``max_stride``.
+    It drops back as soon as the head moves or the face is lost. k never goes
+    below the load floor, which is how many camera frame periods
+    (``frame_interval``) one inference takes on average. A CPU that cannot
+    keep up therefore skips frames evenly instead of falling behind the
+    camera.
+
+    ``predict`` gives the angles for a skipped frame. With ``extrapolate`` the
+    last angles move on at their last velocity for at most one stride;
+    otherwise they are held.
+    """
+
+    def __init__(self, frame_interval=1 / 30, max_stride=4, stable_degrees=2.0, extrapolate=True, smoothing=0.2):
+        self.frame_interval = frame_interval
+        self.max_stride = max_stride
+        self.stable_degrees = stable_degrees
+        self.extrapolate = extrapolate
+        self.smoothing = smoothing
+        self.stride = 1
+        self.floor = 1
+        self.cost = None
+        self.inferred = 0
+        self.skipped = 0
+        self._countdown = 0
+        self._last_time = None
+        self._last_angles = None
+        self._velocity = None
+
+    def should_run(self):
+        """True when this frame should run inference; call once per frame"""
+        self._countdown -= 1
+        if self._countdown > 0:
+            self.skipped += 1
+            return False
+        self.inferred += 1
+        return True
+
+    def observe(self, timestamp, angles, cost):
+        """Record an inference: its (pitch, yaw, roll) angles (an array for several faces, None for no face) and seconds taken"""
+        self.cost = cost if self.cost is None else self.cost + self.smoothing * (cost - self.cost)
+        self.floor = min(self.max_stride, max(1, math.ceil(self.cost / self.frame_interval)))
+
+        stable = False
+        if angles is None:
+            self._last_angles = self._velocity = None
+        else:
+            angles = np.asarray(angles, dtype=np.float64)
+            previous = self._last_angles
+            if previous is not None and previous.shape == angles.shape:
+                change = angles - previous
+                stable = np.abs(change).max(initial=0.0) < self.stable_degrees
+                elapsed = timestamp - self._last_time
+                self._velocity = change / elapsed if elapsed > 0 else np.zeros_like(angles)
+            else:
+                self._velocity = np.zeros_like(angles)
+            self._last_time = timestamp
+            self._last_angles = angles
+
+        self.stride = min(self.stride + 1, self.max_stride) if stable else 1
+        self.stride = max(self.stride, self.floor)
+        self._countdown = self.stride
+
+    def predict(self, timestamp):
+        """Angles for a skipped frame, or None when the last inference found no face"""
+        if self._last_angles is None:
+            return None
+        if not self.extrapolate:
+            return self._last_angles
+        elapsed = min(timestamp - self._last_time, self.stride * self.frame_interval)
+        return self._last_angles + self._velocity * elapsed
+
+    def describe(self):
+        text = f"stride {self.stride}"
+        if self.cost is not None:
+            text += f" ({self.cost * 1000:.0f} ms/inference)"
+        return text
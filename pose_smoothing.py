@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Head pose angle smoothing for the live pose monitors
+Every smoother keeps a fixed NumPy state and does O(1) work per frame:
+a moving average (the monitors' original 5-frame mean), an exponential
+average, a One-Euro filter and a constant-velocity Kalman filter.
+
+Run this module to replay recorded poses through each smoother and compare
+how quickly activity changes are detected and how often the activity flips
+back and forth when it should not.
+
+Usage: python pose_smoothing.py session.ptl [more.ptl ...] [--band 3]
+       python pose_smoothing.py --synthetic
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from classroom_activity import determine_activity
+from pose_telemetry import read_telemetry
+
+
+class MovingAverage:
+    """Mean of the last ``window`` readings, kept as a ring buffer and a running sum"""
+
+    def __init__(self, window=5, dims=3):
+        self.buffer = np.zeros((window, dims))
+        self.total = np.zeros(dims)
+        self.value = np.zeros(dims)
+        self.samples = 0
+
+    def update(self, values, timestamp=None):
+        slot = self.samples % len(self.buffer)
+        if self.samples >= len(self.buffer):
+            self.total -= self.buffer[slot]
+        self.buffer[slot] = values
+        self.total += self.buffer[slot]
+        self.samples += 1
+        np.divide(self.total, min(self.samples, len(self.buffer)), out=self.value)
+        return self.value
+
+    def reset(self):
+        self.samples = 0
+        self.total[:] = 0
+
+
+class ExponentialSmoother:
+    """Exponential moving average: each reading moves the estimate ``alpha`` of the way"""
+
+    def __init__(self, alpha=0.3, dims=3):
+        self.alpha = alpha
+        self.value = np.zeros(dims)
+        self.started = False
+
+    def update(self, values, timestamp=None):
+        if not self.started:
+            self.value[:] = values
+            self.started = True
+        else:
+            self.value += self.alpha * (np.asarray(values) - self.value)
+        return self.value
+
+    def reset(self):
+        self.started = False
+
+
+class OneEuroFilter:
+    """One-Euro filter (Casiez et al., 2012): an exponential average whose cutoff rises with speed.
+
+    Still heads get ``min_cutoff`` Hz of smoothing against jitter; fast turns
+    raise the cutoff by ``beta`` Hz per degree/second, which keeps the lag
+    low. Needs timestamps in seconds.
+    """
+
+    def __init__(self, min_cutoff=0.5, beta=0.05, d_cutoff=1.0, dims=3):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.value = np.zeros(dims)
+        self.speed = np.zeros(dims)
+        self._raw = np.zeros(dims)
+        self._last_time = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        return 1.0 / (1.0 + 1.0 / (2 * math.pi * cutoff * dt))
+
+    def update(self, values, timestamp):
+        if self._last_time is None:
+            self.value[:] = values
+            self._raw[:] = values
+            self.speed[:] = 0
+            self._last_time = timestamp
+            return self.value
+        dt = timestamp - self._last_time
+        if dt <= 0:
+            return self.value
+
+        self._last_time = timestamp
+        values = np.asarray(values, dtype=np.float64)
+        self.speed += self._alpha(self.d_cutoff, dt) * ((values - self._raw) / dt - self.speed)
+        self._raw[:] = values
+        cutoff = self.min_cutoff + self.beta * np.abs(self.speed)
+        self.value += self._alpha(cutoff, dt) * (values - self.value)
+        return self.value
+
+    def reset(self):
+        self._last_time = None
+
+
+class KalmanSmoother:
+    """Constant-velocity Kalman filter, one (angle, rate) state per axis.
+
+    ``process_noise`` is the white-acceleration density in deg^2/s^3 (how
+    abruptly heads turn); ``measurement_noise`` is the landmark jitter
+    variance in deg^2. The axes are independent, so each 2x2 covariance is
+    kept as three arrays and updated in closed form. Needs timestamps in
+    seconds.
+    """
+
+    def __init__(self, process_noise=100.0, measurement_noise=6.0, dims=3):
+        self.q = process_noise
+        self.r = measurement_noise
+        self.value = np.zeros(dims)
+        self.rate = np.zeros(dims)
+        # Covariance [[p00, p01], [p01, p11]] per axis
+        self.p00 = np.zeros(dims)
+        self.p01 = np.zeros(dims)
+        self.p11 = np.zeros(dims)
+        self._last_time = None
+
+    def update(self, values, timestamp):
+        if self._last_time is None:
+            self.value[:] = values
+            self.rate[:] = 0
+            self.p00[:] = self.r
+            self.p01[:] = 0
+            self.p11[:] = 100.0 ** 2  # Unknown rate: up to ~100 deg/s
+            self._last_time = timestamp
+            return self.value
+
+        # Predict
+        dt = max(timestamp - self._last_time, 0.0)
+        self._last_time = timestamp
+        self.value += self.rate * dt
+        self.p00 += dt * (2 * self.p01 + dt * self.p11) + self.q * dt ** 3 / 3
+        self.p01 += dt * self.p11 + self.q * dt ** 2 / 2
+        self.p11 += self.q * dt
+
+        # Correct
+        residual = np.asarray(values) - self.value
+        gain_value = self.p00 / (self.p00 + self.r)
+        gain_rate = self.p01 / (self.p00 + self.r)
+        self.value += gain_value * residual
+        self.rate += gain_rate * residual
+        self.p11 -= gain_rate * self.p01
+        self.p01 *= 1 - gain_value
+        self.p00 *= 1 - gain_value
+        return self.value
+
+    def reset(self):
+        self._last_time = None
+
+
+SMOOTHERS = {
+    'mean': MovingAverage,
+    'ema': ExponentialSmoother,
+    'one-euro': OneEuroFilter,
+    'kalman': KalmanSmoother
+}
+
+def make_smoother(name='mean', dims=3):
+    """A fresh smoother by its SMOOTHERS name"""
+    return SMOOTHERS[name](dims=dims)
+
+
+# Replay benchmark
+
+def synthetic_recording(seconds=120, fps=30.0, noise=2.5, seed=0):
+    """(times, (n, 3) angles, (n, 3) noise-free angles) of a made-up lesson with jittery landmarks"""
+    rng = np.random.default_rng(seed)
+    # Pitch, yaw of each kind of activity
+    poses = np.array([(0, 0), (30, 0), (0, 35), (0, -35), (-25, 0), (18, 5), (0, 23)], dtype=np.float64)
+    times = np.arange(0, seconds, 1 / fps)
+    clean = np.zeros((len(times), 3))
+    start, current = 0.0, np.zeros(2)
+    while start < seconds:
+        duration = rng.uniform(1.0, 6.0)
+        target = poses[rng.integers(len(poses))]
+        segment = (times >= start) & (times < start + duration)
+        # Heads take about 0.2 s to turn
+        ramp = np.clip((times[segment] - start) / 0.2, 0, 1)[:, None]
+        clean[segment, :2] = current + (target - current) * ramp
+        start, current = start + duration, target
+    angles = clean + rng.normal(0, noise, clean.shape)
+    return times, angles, clean
+
+def telemetry_recordings(path):
+    """(times, (n, 3) angles) per student in a telemetry file, skipping frames without a face"""
+    header, records = read_telemetry(path)
+    recordings = []
+    for track in np.unique(records['track']):
+        rows = records[(records['track'] == track) & np.isfinite(records['pitch'])]
+        if len(rows) > 1:
+            times = (rows['t_ns'] - rows['t_ns'][0]) / 1e9
+            recordings.append((times, np.stack((rows['pitch'], rows['yaw'], rows['roll']), axis=1).astype(np.float64)))
+    return recordings
+
+def centred_mean(times, angles, seconds=0.5):
+    """Non-causal moving average, the reference for recordings without ground truth"""
+    rate = (len(times) - 1) / (times[-1] - times[0]) if times[-1] > times[0] else 30.0
+    half = max(1, int(round(seconds * rate / 2)))
+    padded = np.pad(angles, ((half, half), (0, 0)), mode='edge')
+    sums = np.cumsum(np.pad(padded, ((1, 0), (0, 0))), axis=0)
+    return (sums[2 * half + 1:] - sums[:-2 * half - 1]) / (2 * half + 1)
+
+def classify(angles, band=0.0):
+    labels, previous = [], None
+    for pitch, yaw in angles[:, :2]:
+        previous = determine_activity(pitch, yaw, previous, band)
+        labels.append(previous)
+    return labels
+
+def transitions(times, labels):
+    """(times, new labels) of every activity change"""
+    changes = [i for i in range(1, len(labels)) if labels[i] != labels[i - 1]]
+    return times[changes], [labels[i] for i in changes]
+
+def score(times, labels, reference, match_seconds=1.0):
+    """Detection latencies of the reference's activity changes and the count of changes it does not have"""
+    ref_times, ref_labels = transitions(times, reference)
+    out_times, out_labels = transitions(times, labels)
+
+    latencies, used = [], set()
+    for ref_time, label in zip(ref_times, ref_labels):
+        lo, hi = np.searchsorted(out_times, (ref_time - match_seconds, ref_time + match_seconds))
+        for index in range(lo, hi):
+            if index not in used and out_labels[index] == label:
+                used.add(index)
+                latencies.append(out_times[index] - ref_time)
+                break
+    false_flips = len(out_times) - len(used)
+    return np.array(latencies), len(ref_times) - len(latencies), false_flips, len(out_times)
+
+def replay(recordings, name, band):
+    """Feed every recording through one smoother; returns totals for the report"""
+    latencies, missed, false_flips, flips, updates, seconds = [], 0, 0, 0, 0, 0.0
+    for times, angles, reference in recordings:
+        smoother = make_smoother(name)
+        smoothed = np.empty_like(angles)
+        started = time.perf_counter()
+        for index in range(len(times)):
+            smoothed[index] = smoother.update(angles[index], times[index])
+        seconds += time.perf_counter() - started
+        updates += len(times)
+
+        result = score(times, classify(smoothed, band), reference)
+        latencies.append(result[0])
+        missed += result[1]
+        false_flips += result[2]
+        flips += result[3]
+    latencies = np.concatenate(latencies) if latencies else np.zeros(0)
+    return latencies, missed, false_flips, flips, seconds / max(updates, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare pose smoothers on recorded or synthetic head poses')
+    parser.add_argument('telemetry', nargs='*', help='Telemetry files written by --telemetry')
+    parser.add_argument('--synthetic', action='store_true', help='Replay a generated lesson with known true poses')
+    parser.add_argument('--band', type=float, default=3.0, help='Hysteresis band (degrees) compared with none')
+    parser.add_argument('--reference-seconds', type=float, default=0.5,
+                        help='Window of the centred average used as the truth for recorded poses')
+    args = parser.parse_args()
+    if not args.telemetry and not args.synthetic:
+        parser.error('Give telemetry files or --synthetic')
+
+    recordings = []
+    if args.synthetic:
+        times, angles, clean = synthetic_recording()
+        recordings.append((times, angles, classify(clean)))
+    for path in args.telemetry:
+        for times, angles in telemetry_recordings(path):
+            recordings.append((times, angles, classify(centred_mean(times, angles, args.reference_seconds))))
+    if not recordings:
+        print("No poses to replay")
+        return
+
+    frames = sum(len(times) for times, _, _ in recordings)
+    changes = sum(len(transitions(times, reference)[0]) for times, _, reference in recordings)
+    print(f"{frames} frames, {changes} reference activity changes")
+    print(f"{'smoother':<10} {'band':>5} {'changes':>8} {'false':>6} {'missed':>7} "
+          f"{'median ms':>10} {'p90 ms':>7} {'us/frame':>9}")
+    for name in SMOOTHERS:
+        for band in sorted({0.0, args.band}):
+            latencies, missed, false_flips, flips, per_update = replay(recordings, name, band)
+            median = np.median(latencies) * 1000 if len(latencies) else float('nan')
+            p90 = np.percentile(latencies, 90) * 1000 if len(latencies) else float('nan')
+            print(f"{name:<10} {band:>5.1f} {flips:>8} {false_flips:>6} {missed:>7} "
+                  f"{median:>10.0f} {p90:>7.0f} {per_update * 1e6:>9.1f}")
+
+if __name__ == "__main__":
+    main()
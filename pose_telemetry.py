@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Binary pose telemetry for the head pose scripts
+Every frame is stored as a fixed-width record (monotonic timestamp, pitch,
+yaw, roll, translation, an activity code and a student id) in an append-only
+file that loads straight into a NumPy structured array. Run this module to
+convert a telemetry file to the timestamp,label CSV layout of the activity logs.
+
+File layout: a 32-byte header (magic, version, record size, header size,
+session start as wall-clock seconds and monotonic ns), the activity labels
+as JSON, then the records back to back.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b'POSETLM1'
+VERSION = 1
+# magic, version, record size, header size (incl. labels), start wall time (s), start monotonic (ns)
+HEADER = struct.Struct('<8sHHIdq')
+
+RECORD = np.dtype([
+    ('t_ns', '<i8'),
+    ('pitch', '<f4'),
+    ('yaw', '<f4'),
+    ('roll', '<f4'),
+    ('tx', '<f4'),
+    ('ty', '<f4'),
+    ('tz', '<f4'),
+    ('activity', '<u2'),
+    ('track', '<u2')       # Student id in multi-student mode, else 0
+])
+
+# Every label the head pose scripts produce; the code stored is the index
+ACTIVITY_LABELS = [
+    'Unknown',
+    'Focused',
+    'Viewing Board',
+    'Writing',
+    'Distracted - Looking Sideways',
+    'Distracted - Looking Down',
+    'Distracted - Looking Up',
+    'Looking Up',
+    'Looking Down',
+    'Turned Left',
+    'Turned Right',
+    'No Face'
+]
+
+
+def _read_header(f):
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError('Telemetry file is truncated')
+    magic, version, record_size, header_size, start_wall, start_ns = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError('Not a pose telemetry file')
+    if version != VERSION or record_size != RECORD.itemsize:
+        raise ValueError(f'Unsupported telemetry version {version} (record size {record_size})')
+    labels = json.loads(f.read(header_size - HEADER.size).decode())
+    return {
+        'version': version,
+        'header_size': header_size,
+        'start_wall_time': start_wall,
+        'start_monotonic_ns': start_ns,
+        'labels': labels
+    }
+
+
+class TelemetryWriter:
+    """Appends pose records to a telemetry file, ``buffer_size`` records per write.
+
+    An existing file is continued (its labels must match). Records are filled
+    into a preallocated structured buffer and written one buffer at a time.
+
+    Timestamps default to ``time.monotonic_ns()``. Offline callers can pass
+    ``start_time`` (wall-clock seconds) and then give each record its
+    ``timestamp_ns`` from that start. When continuing a file written in an
+    earlier session (possibly before a reboot, with another monotonic
+    origin), timestamps are shifted onto the file's clock through the wall
+    time, so ``wall_times`` stays right for old and new records alike.
+    """
+
+    def __init__(self, path, labels=ACTIVITY_LABELS, buffer_size=256, start_time=None):
+        self.path = path
+        self.labels = list(labels)
+        self._codes = {label: code for code, label in enumerate(self.labels)}
+        self._buffer = np.zeros(buffer_size, dtype=RECORD)
+        self._count = 0
+        if start_time is None:
+            start_wall, start_ns = time.time(), time.monotonic_ns()
+        else:
+            start_wall, start_ns = start_time, 0
+        # Added to every timestamp; non-zero only when continuing another session's file
+        self._offset_ns = 0
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                header = _read_header(f)
+            if header['labels'] != self.labels:
+                raise ValueError(f'{path} was written with different activity labels')
+            self._offset_ns = (round((start_wall - header['start_wall_time']) * 1e9)
+                               + header['start_monotonic_ns'] - start_ns)
+            # Drop a partial record left by a crash so records stay aligned
+            size = os.path.getsize(path)
+            records = (size - header['header_size']) // RECORD.itemsize
+            self._file = open(path, 'r+b')
+            self._file.truncate(header['header_size'] + records * RECORD.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            encoded = json.dumps(self.labels).encode()
+            self._file = open(path, 'wb')
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize, HEADER.size + len(encoded),
+                                         start_wall, start_ns))
+            self._file.write(encoded)
+
+    def write(self, pose, label, timestamp_ns=None, track=0):
+        """Record one frame: a PoseRecord (or None when there is no face), its activity label and student id"""
+        t_ns = (time.monotonic_ns() if timestamp_ns is None else timestamp_ns) + self._offset_ns
+        code = self._codes.get(label, 0)
+        if pose is None:
+            self._buffer[self._count] = (t_ns, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, code, track)
+        else:
+            tx, ty, tz = pose.translation_vector.ravel()
+            self._buffer[self._count] = (t_ns, pose.pitch, pose.yaw, pose.roll, tx, ty, tz, code, track)
+
+        self._count += 1
+        if self._count == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        if self._count:
+            self._file.write(self._buffer[:self._count].tobytes())
+            self._file.flush()
+            self._count = 0
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read_telemetry(path):
+    """Return (header, records): the records are a read-only memory-mapped structured array"""
+    with open(path, 'rb') as f:
+        header = _read_header(f)
+    count = (os.path.getsize(path) - header['header_size']) // RECORD.itemsize
+    if count == 0:
+        return header, np.zeros(0, dtype=RECORD)
+    return header, np.memmap(path, dtype=RECORD, mode='r', offset=header['header_size'], shape=(count,))
+
+def wall_times(header, records):
+    """Local wall-clock datetime64[us] of each record"""
+    start = header['start_wall_time']
+    # Records are in monotonic time; anchor them at the session start, in local time like datetime.now()
+    utc_offset = datetime.datetime.fromtimestamp(start).astimezone().utcoffset()
+    seconds = start + utc_offset.total_seconds() + (records['t_ns'] - header['start_monotonic_ns']) / 1e9
+    return (seconds * 1e6).astype('datetime64[us]')
+
+def export_csv(path, csv_path, angles=False):
+    """Write a telemetry file as timestamp,label rows (plus pitch,yaw,roll with ``angles``)"""
+    header, records = read_telemetry(path)
+    timestamps = np.char.replace(np.datetime_as_string(wall_times(header, records), unit='us'), 'T', ' ')
+    labels = np.asarray(header['labels'], dtype=object)[records['activity']]
+
+    with open(csv_path, 'w', newline='') as f:
+        if angles:
+            for row in zip(timestamps, labels, records['pitch'], records['yaw'], records['roll']):
+                f.write(f'{row[0]},{row[1]},{row[2]:.2f},{row[3]:.2f},{row[4]:.2f}\n')
+        else:
+            f.writelines(f'{timestamp},{label}\n' for timestamp, label in zip(timestamps, labels))
+    return len(records)
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert pose telemetry to the activity log CSV layout')
+    parser.add_argument('telemetry', help='Telemetry file written by --telemetry')
+    parser.add_argument('-o', '--output', help='CSV file to write (default: telemetry path with .csv)')
+    parser.add_argument('--angles', action='store_true', help='Append pitch, yaw and roll columns')
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.telemetry)[0] + '.csv'
+    count = export_csv(args.telemetry, output, args.angles)
+    print(f"Wrote {count} records to {output}")
+
+if __name__ == "__main__":
+    main()
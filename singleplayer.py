@@ -1,14 +1,113 @@
 import pygame
 from pygame import display ,draw , event , font
 import sys
+import threading
+import time
 import cv2
 import handDetector as hd
+from camera_source import CameraSource
 import numpy as np
 
+# Physics steps per second, independent of how fast hand tracking runs
+PHYSICS_HZ = 60
+# Ball speeds below are per step; they match the old per-frame speeds at 30 fps
+SPEED_SCALE = 30 / PHYSICS_HZ
+RENDER_FPS = 60
+# Longest the paddle is extrapolated past the latest hand sample, in seconds
+MAX_EXTRAPOLATION = 0.1
+# Camera preview size and position on the score panel
+PREVIEW_SIZE = (256, 192)
+PREVIEW_POS = (505, 154)
+
+class HandWorker:
+    """Hand tracking on a background thread, at whatever rate it manages.
+
+    Each processed frame leaves a (capture time, paddle x) sample in a fixed
+    two-slot array and a preview. The frame is converted to RGB once, into a
+    preallocated buffer that feeds both the hand model and the preview, and
+    ``draw_preview`` blits the preview into a persistent Surface, so the
+    sample and preview buffers are reused every frame. ``paddle(now)`` extrapolates the paddle from the last two
+    samples to ``now`` (time.monotonic(), the clock the capture times use), for
+    at most MAX_EXTRAPOLATION seconds, so the paddle moves smoothly and without
+    the inference delay however slow the model is.
+    """
+
+    def __init__(self, cap, detector):
+        self.cap = cap
+        self.detector = detector
+        # Rows: the older and the newer (capture time, paddle x) sample
+        self.samples = np.zeros((2, 2))
+        self.sampleCount = 0
+        self.rgb = None
+        self.preview = np.zeros(PREVIEW_SIZE[::-1] + (3,), dtype=np.uint8)
+        # Mirrored and in pygame's (x, y) order, as the old 90 degree rotation gave
+        self._previewView = self.preview.swapaxes(0, 1)[::-1]
+        self._fresh = False
+        self.shown = False
+        self.running = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self.running = True
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        self._thread.join(timeout=2)
+
+    def _loop(self):
+        while self.running:
+            success, img = self.cap.read()
+            if not success:
+                break
+            if self.rgb is None or self.rgb.shape != img.shape:
+                self.rgb = np.empty_like(img)
+            cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.rgb)
+            self.detector.process(img, draw=False, timestamp=self.cap.timestamp, rgb=self.rgb)
+            hands = self.detector.pixels()
+            found = len(hands) > 0
+            if found:
+                # Index fingertip
+                tipX, tipY = hands[0, 8].tolist()
+                cv2.circle(self.rgb,(tipX,tipY),5,(0,255,0),cv2.FILLED)
+            with self._lock:
+                if found:
+                    self.samples[0] = self.samples[1]
+                    self.samples[1, 0] = self.cap.timestamp
+                    self.samples[1, 1] = np.interp(tipX,[70,330],[400,100])
+                    self.sampleCount = min(self.sampleCount + 1, 2)
+                cv2.resize(self.rgb, PREVIEW_SIZE, dst=self.preview, interpolation=cv2.INTER_AREA)
+                self._fresh = True
+        self.running = False
+
+    def draw_preview(self, surface):
+        """Copy a new preview into surface; False until the first frame"""
+        with self._lock:
+            if self._fresh:
+                pygame.surfarray.blit_array(surface, self._previewView)
+                self._fresh = False
+                self.shown = True
+        return self.shown
+
+    def paddle(self, now):
+        """Paddle x at ``now``, or None before the first hand is seen"""
+        with self._lock:
+            count = self.sampleCount
+            (t0, x0), (t1, x1) = self.samples.tolist()
+        if count == 0:
+            return None
+        if count < 2 or t1 - t0 > 0.25:
+            return x1
+        velocity = (x1 - x0) / max(t1 - t0, 1e-3)
+        x = x1 + velocity * min(max(now - t1, 0.0), MAX_EXTRAPOLATION)
+        return min(max(x, 100), 400)
+
 def run():
     pygame.init()
-    cap = cv2.VideoCapture(0)
-    detector = hd.HandDetector(HandNo=1)
+    cap = CameraSource(0)
+    detector = hd.HandDetector(HandNo=1, roi=True)
+    worker = HandWorker(cap, detector)
 
     screen = display.set_mode((766,500))
     display.set_caption("Table Tennis - Single Player")
@@ -46,47 +145,66 @@ def run():
         return x,y,changeX,changeY ,compScore 
 
     myfont = font.Font("freesansbold.ttf",20)
+    scorefont = font.Font('C:\\Windows\\Fonts\\ARLRDBD.TTF',20)
+    overfont = font.Font('C:\\Windows\\Fonts\\ARLRDBD.TTF',50)
+    # Text only changes with the score, so keep what has been rendered
+    rendered = {}
+    preview = pygame.Surface(PREVIEW_SIZE)
 
     x = 250
     y= 250
-    changeX = 0.5*5
-    changeY = -1*5
+    changeX = 0.5*5*SPEED_SCALE
+    changeY = -1*5*SPEED_SCALE
     playerPosX = 100
     compScore = 0
     playerScore = 0
     color =(0,0,0)
     color1 =(0,255,0)
 
+    def render(myfont,text,color):
+        key = (myfont,text,color)
+        if key not in rendered:
+            rendered[key] = myfont.render(text,True,color)
+        return rendered[key]
+
     def score(posX,posY,text,score,color):
-        myfont = font.Font('C:\\Windows\\Fonts\\ARLRDBD.TTF',20)
-        myrender = myfont.render(text+str(score),True,color)
+        myrender = render(scorefont,text+str(score),color)
         screen.blit(myrender,(posX,posY))
 
     def gameOver(color):
-        myfont = font.Font('C:\\Windows\\Fonts\\ARLRDBD.TTF',50)
-        myrender = myfont.render("GAME OVER",True,(0,0,0))
+        myrender = render(overfont,"GAME OVER",(0,0,0))
         screen.blit(myrender,(90,200))
         color =(255,0,0)
         return color
 
-    while True:
-        success , img = cap.read()
-        img = detector.process(img, draw=False)
-        lmList = detector.fingerdetector(img)
-
-        if lmList:
-            playerPosX = np.interp(lmList[8][1],[70,330],[400,100])
-            cv2.circle(img,(lmList[8][1],lmList[8][2]),5,(0,255,0),cv2.FILLED)
+    step = 1 / PHYSICS_HZ
+    clock = pygame.time.Clock()
+    worker.start()
+    previous = time.monotonic()
+    lag = 0.0
 
+    while worker.running:
         allevents = event.get()
         for myevent in allevents:
             if myevent.type == pygame.QUIT:
+                worker.stop()
+                cap.release()
                 sys.exit()
 
+        now = time.monotonic()
+        # Cap the catch-up after a stall so the ball never jumps across the table
+        lag = min(lag + now - previous, 0.25)
+        previous = now
+        while lag >= step:
+            lag -= step
+            hand = worker.paddle(now - lag)
+            if hand is not None:
+                playerPosX = hand
+            x,y,playerPosX,changeY,color,playerScore = checkhit(x,y,playerPosX,changeY,color,playerScore)
+            x,y,changeX,changeY,compScore = moveball(x,y,changeX,changeY,compScore)
+
         screen.fill((193, 225, 193))
         drawcircle(x,y,10)
-        x,y,playerPosX,changeY,color,playerScore = checkhit(x,y,playerPosX,changeY,color,playerScore)
-        x,y,changeX,changeY,compScore = moveball(x,y,changeX,changeY,compScore)
         drawrect(x,10,(0,0,0))
         if y == 520:
             color1 = gameOver(color)
@@ -96,10 +214,9 @@ def run():
         score(505,20,"Computer : ",compScore,(255,255,255))
         score(505,420,"Player : ",playerScore,color1)
 
-        img = cv2.resize(img, (256, 192))
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        img = pygame.surfarray.make_surface(img)
-        screen.blit(img,(505,154))
+        if worker.draw_preview(preview):
+            screen.blit(preview,PREVIEW_POS)
         display.flip()
-        cv2.waitKey(1)
+        clock.tick(RENDER_FPS)
+
+    cap.release()
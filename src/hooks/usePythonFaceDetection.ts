@@ -1,6 +1,9 @@
 import { useEffect, useRef, useState, useCallback } from 'react';
 import { io, Socket } from 'socket.io-client';
 
+// Starting frame interval; the backend adjusts it via recommended_interval_ms
+const DEFAULT_SEND_INTERVAL_MS = 100;
+
 type Violation = {
   time: string;
   type: string;
@@ -16,6 +19,7 @@ export function usePythonFaceDetection(
   const socketRef = useRef<Socket | null>(null);
   const canvasRef = useRef<HTMLCanvasElement | null>(null);
   const lastViolationRef = useRef<number>(0);
+  const sendIntervalRef = useRef<number>(DEFAULT_SEND_INTERVAL_MS);
   const [faceAnalysis, setFaceAnalysis] = useState({
     faceDetected: false,
     faceCount: 0,
@@ -52,6 +56,11 @@ export function usePythonFaceDetection(
     });
 
     socketRef.current.on('detection_result', (result) => {
+      // Slow down (or speed back up) to whatever rate the backend can keep up with
+      if (typeof result.recommended_interval_ms === 'number') {
+        sendIntervalRef.current = Math.max(DEFAULT_SEND_INTERVAL_MS, result.recommended_interval_ms);
+      }
+
       if (result.error) {
         console.error('Face detection error:', result.error);
         return;
@@ -139,11 +148,12 @@ export function usePythonFaceDetection(
     // Draw current video frame to canvas
     ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-    // Convert to base64
-    const frameData = canvas.toDataURL('image/jpeg', 0.8);
-
-    // Send to Python backend
-    socketRef.current.emit('process_frame', { frame: frameData });
+    // Encode as JPEG and send the raw bytes as a binary attachment (no base64)
+    canvas.toBlob(async (blob) => {
+      if (!blob || !socketRef.current?.connected) return;
+      const frameData = await blob.arrayBuffer();
+      socketRef.current?.emit('process_frame', { frame: frameData });
+    }, 'image/jpeg', 0.8);
   }, [videoRef, enabled]);
 
   useEffect(() => {
@@ -159,9 +169,15 @@ export function usePythonFaceDetection(
   useEffect(() => {
     if (!enabled) return;
 
-    const interval = setInterval(captureAndSendFrame, 100); // Process every 100ms
+    // Re-read the interval on every tick so backend backpressure takes effect immediately
+    let timeout: ReturnType<typeof setTimeout>;
+    const tick = () => {
+      captureAndSendFrame();
+      timeout = setTimeout(tick, sendIntervalRef.current);
+    };
+    timeout = setTimeout(tick, sendIntervalRef.current);
 
-    return () => clearInterval(interval);
+    return () => clearTimeout(timeout);
   }, [enabled, captureAndSendFrame]);
 
   function maybeAddViolation(type: string, detail: string, severity: 'WARNING' | 'MAJOR' | 'CRITICAL') {
@@ -0,0 +1,130 @@
+"""
+Stable student ids for the multi-face classroom monitor
+StudentTracks matches each frame's face boxes to the previous frame's tracks by
+IoU, falling back to centroid distance, and keeps a small state per student.
+"""
+
+import numpy as np
+
+from pose_smoothing import MovingAverage
+
+
+class Track:
+    """Per-student state: last box, angle smoother and activity timers"""
+
+    __slots__ = ('id', 'box', 'missed', 'smoother', 'current_activity', 'activity', 'activity_since',
+                 'writing_since', 'distracted_since')
+
+    def __init__(self, track_id, box, smoother):
+        self.id = track_id
+        self.box = box
+        self.missed = 0
+        self.smoother = smoother
+        # Activity of the latest frame, and the one being timed for the log
+        self.current_activity = None
+        self.activity = None
+        # Timestamps the current activity, writing and distraction started at
+        self.activity_since = None
+        self.writing_since = None
+        self.distracted_since = None
+
+    def smooth(self, pitch, yaw, roll, timestamp=None):
+        """Add a reading and return the smoothed (pitch, yaw, roll)"""
+        return self.smoother.update((pitch, yaw, roll), timestamp)
+
+
+def boxes_from_points(points):
+    """(faces, 4) x1, y1, x2, y2 boxes around each face's (faces, n, 2) points"""
+    return np.concatenate((points.min(axis=1), points.max(axis=1)), axis=1)
+
+def iou_matrix(a, b):
+    """Pairwise IoU of (n, 4) and (m, 4) x1, y1, x2, y2 boxes"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+def greedy_match(scores, threshold, higher_is_better=True):
+    """(row, col) pairs taken best score first, each row and column used once"""
+    if scores.size == 0:
+        return []
+    order = np.argsort(-scores if higher_is_better else scores, axis=None)
+    rows, cols = np.unravel_index(order, scores.shape)
+    used_rows, used_cols, pairs = set(), set(), []
+    for row, col in zip(rows, cols):
+        score = scores[row, col]
+        if (score < threshold) if higher_is_better else (score > threshold):
+            break
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        pairs.append((row, col))
+    return pairs
+
+
+class StudentTracks:
+    """Associates face boxes with students across frames.
+
+    Boxes are matched to tracks by IoU (at least ``min_iou``); boxes left
+    over are matched by centroid distance, up to ``max_distance`` face widths,
+    which holds a student through fast head turns. Unmatched boxes start new
+    tracks; tracks unseen for ``max_missed`` frames end. Each track smooths
+    its angles with its own ``make_smoother()`` (by default the mean of the
+    last 5 readings).
+    """
+
+    def __init__(self, min_iou=0.3, max_distance=1.0, max_missed=15, make_smoother=MovingAverage):
+        self.min_iou = min_iou
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.make_smoother = make_smoother
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, boxes):
+        """Match this frame's (faces, 4) boxes; returns (track per box, tracks that ended)"""
+        assigned = [None] * len(boxes)
+        free_tracks = list(range(len(self.tracks)))
+        free_boxes = list(range(len(boxes)))
+
+        if self.tracks and len(boxes):
+            previous = np.array([track.box for track in self.tracks])
+            for row, col in greedy_match(iou_matrix(previous, boxes), self.min_iou):
+                assigned[col] = self.tracks[row]
+            free_tracks = [i for i in free_tracks if self.tracks[i] not in assigned]
+            free_boxes = [i for i in free_boxes if assigned[i] is None]
+
+            if free_tracks and free_boxes:
+                left, right = previous[free_tracks], boxes[free_boxes]
+                centres_left = (left[:, :2] + left[:, 2:]) / 2
+                centres_right = (right[:, :2] + right[:, 2:]) / 2
+                widths = np.maximum(left[:, 2] - left[:, 0], 1)[:, None]
+                distances = np.linalg.norm(centres_left[:, None] - centres_right[None], axis=2) / widths
+                for row, col in greedy_match(distances, self.max_distance, higher_is_better=False):
+                    assigned[free_boxes[col]] = self.tracks[free_tracks[row]]
+
+        for index, box in enumerate(boxes):
+            if assigned[index] is None:
+                assigned[index] = Track(self._next_id, box, self.make_smoother())
+                self._next_id += 1
+                self.tracks.append(assigned[index])
+            else:
+                assigned[index].box = box
+                assigned[index].missed = 0
+
+        matched = {id(track) for track in assigned}
+        ended = []
+        for track in self.tracks:
+            if id(track) not in matched:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    ended.append(track)
+        if ended:
+            self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return assigned, ended
@@ -0,0 +1,60 @@
+import threading
+
+import numpy as np
+
+import camera_source
+from camera_source import CameraSource
+
+
+class FakeCamera:
+    """Fills the buffer it is given, like cv2.VideoCapture.read(image)"""
+
+    def __init__(self, frames, shape=(4, 6, 3)):
+        self.frames = frames
+        self.shape = shape
+        self.count = 0
+        self.buffers = []
+        self.done = threading.Event()
+        self.closed = threading.Event()
+
+    def read(self, image=None):
+        if self.count >= self.frames:
+            # Hold the last frame until the test is done with it
+            self.done.set()
+            self.closed.wait(2)
+            return False, None
+        self.count += 1
+        if image is None:
+            image = np.empty(self.shape, dtype=np.uint8)
+        else:
+            self.buffers.append(image)
+        image[:] = self.count
+        return True, image
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def test_frames_are_captured_into_the_ring_in_place(monkeypatch):
+    resized = []
+    monkeypatch.setattr(camera_source.cv2, 'resize', lambda *args, **kwargs: resized.append(args))
+    cap = FakeCamera(frames=20)
+    source = CameraSource(cap=cap, slots=3)
+    slots = source.ring.frames if source.start() else None
+    before = [slot.__array_interface__['data'][0] for slot in slots]
+    assert cap.done.wait(2)
+    ok, frame = source.read(wait=False)
+    cap.closed.set()
+    source.stop()
+
+    # Every read went straight into a slot and no slot was replaced
+    assert len(cap.buffers) == 19
+    assert all(buf.ctypes.data in before for buf in cap.buffers)
+    assert resized == []
+    assert source.ring.frames is slots
+    assert [slot.__array_interface__['data'][0] for slot in source.ring.frames] == before
+    assert ok and frame.ctypes.data in before
+    assert frame[0, 0, 0] == 20